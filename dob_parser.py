@@ -0,0 +1,119 @@
+import datetime
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# ---------- DOB Parsing ---------- #
+# DOB is the blocking key of every matcher and report, so it is parsed the
+# same way everywhere: each distinct raw string once, one vectorized
+# to_datetime pass per explicit format (first format that parses wins, no
+# per-row try/except), stored as an Int32 day number since 1970-01-01
+# (missing -> <NA>). Values that parse under several formats to different
+# dates are counted as ambiguous; values no format accepts as failed.
+
+# Formats report_new.py has always accepted, in its order
+REPORT_DOB_FORMATS = ["%d-%m-%Y", "%d/%m/%Y", "%m/%d/%Y", "%Y-%m-%d"]
+
+# Day-first formats seen in the UCIC dump / new-customer file (Excel date
+# cells come through as "YYYY-MM-DD HH:MM:SS")
+UCIC_DOB_FORMATS = [
+    "%d-%m-%Y", "%d/%m/%Y", "%d.%m.%Y", "%Y-%m-%d", "%Y-%m-%d %H:%M:%S",
+    "%d-%b-%Y", "%d %b %Y", "%d-%m-%y", "%d/%m/%y",
+]
+
+DobStats = namedtuple('DobStats', ['rows', 'missing', 'parsed', 'ambiguous', 'failed', 'distinct'])
+
+
+def _to_days(parsed):
+    """(parsed mask, int32 day numbers) of a datetime Series."""
+    hit = parsed.notna().to_numpy()
+    days = np.zeros(len(parsed), dtype=np.int32)
+    days[hit] = parsed[hit].to_numpy().astype('datetime64[D]').astype(np.int64)
+    return hit, days
+
+
+def parse_dob(values, formats=UCIC_DOB_FORMATS, fallback_dayfirst=False):
+    """(Int32 day numbers, DobStats) for a column of raw DOB values.
+
+    fallback_dayfirst additionally runs the values no explicit format
+    accepts through pandas' day-first mixed-format parser.
+    """
+    values = pd.Series(values)
+    codes, uniques = pd.factorize(values)
+    raw = pd.Series(uniques, dtype=object).astype(str).str.strip()
+
+    # Work in day numbers: a placeholder like 01-01-0001 would overflow a
+    # nanosecond datetime Series
+    day = np.zeros(len(raw), dtype=np.int32)
+    ok = np.zeros(len(raw), dtype=bool)
+    ambiguous = np.zeros(len(raw), dtype=bool)
+    for fmt in formats:
+        hit, attempt = _to_days(pd.to_datetime(raw, format=fmt, errors='coerce'))
+        ambiguous |= hit & ok & (attempt != day)
+        fresh = hit & ~ok
+        day[fresh], ok[fresh] = attempt[fresh], True
+    if fallback_dayfirst:
+        todo = np.flatnonzero(~ok & (raw != "").to_numpy())
+        if len(todo):
+            hit, attempt = _to_days(pd.to_datetime(raw.iloc[todo], format='mixed', dayfirst=True, errors='coerce'))
+            day[todo[hit]], ok[todo[hit]] = attempt[hit], True
+
+    # Code -1 (missing raw value) maps to the appended masked slot
+    days = pd.arrays.IntegerArray(np.append(day, 0).astype(np.int32)[codes], np.append(~ok, True)[codes])
+
+    counts = np.bincount(codes[codes >= 0], minlength=len(raw))
+    blank = (raw == "").to_numpy()
+    stats = DobStats(
+        rows=len(values),
+        missing=int((codes < 0).sum() + counts[blank].sum()),
+        parsed=int(counts[ok].sum()),
+        ambiguous=int(counts[ambiguous].sum()),
+        failed=int(counts[~ok & ~blank].sum()),
+        distinct=len(raw),
+    )
+    return pd.Series(days, index=values.index, name='dob_day'), stats
+
+
+EPOCH = datetime.date(1970, 1, 1)
+
+
+def parse_dob_value(value, formats=UCIC_DOB_FORMATS, fallback_dayfirst=False):
+    """Day number of one raw DOB (None if missing / unparseable), by the
+    same rules as parse_dob but without a pandas round trip per value."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    raw = str(value).strip()
+    if not raw:
+        return None
+    for fmt in formats:
+        try:
+            return (datetime.datetime.strptime(raw, fmt).date() - EPOCH).days
+        except ValueError:
+            continue
+    if fallback_dayfirst:
+        parsed = pd.to_datetime(pd.Series([raw]), format='mixed', dayfirst=True, errors='coerce')
+        hit, days = _to_days(parsed)
+        if hit[0]:
+            return int(days[0])
+    return None
+
+
+def days_to_dates(days):
+    """datetime.date per Int32 day number (NaT where missing)."""
+    days = pd.Series(days)
+    codes, uniques = pd.factorize(days)
+    dates = np.asarray(uniques, dtype=np.int64).astype('datetime64[D]').astype(object)
+    return pd.Series(np.append(dates, pd.NaT)[codes], index=days.index, dtype=object)
+
+
+def format_stats(stats, label=None):
+    label = f" ({label})" if label else ""
+    return (f"📅 DOB{label}: {stats.parsed}/{stats.rows} parsed, {stats.missing} missing, "
+            f"{stats.failed} unparseable, {stats.ambiguous} ambiguous ({stats.distinct} distinct values)")
+
+
+def summed_stats(counts):
+    """DobStats of counts tallied over several parse_dob calls (distinct
+    adds up per call, so a value seen in two chunks counts twice)."""
+    return DobStats(**{field: counts.get(field, 0) for field in DobStats._fields})
@@ -0,0 +1,185 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import process, fuzz
+
+from output_writers import write_frame
+
+# ---------- Duplicate Clustering Engine ---------- #
+# Records are blocked by DOB; inside a block the distinct names are scored
+# against each other with one cdist matrix, and every pair scoring at or above
+# the threshold is linked in a union-find. Clusters are the connected
+# components with more than one record. Cluster IDs are numbered 1..K in
+# order of each cluster's first record, so they are stable for a given input.
+
+# Upper bound on the cells of one cdist score matrix (~128 MB of float64)
+CLUSTER_MAX_CELLS = 1 << 24
+
+
+class UnionFind:
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, x):
+        parent = self.parent
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        # The smaller position becomes the root, so a root is always the
+        # first record of its component
+        ra, rb = self.find(a), self.find(b)
+        if ra < rb:
+            self.parent[rb] = ra
+        elif rb < ra:
+            self.parent[ra] = rb
+
+
+def _score_names(uniques, first_new, threshold, max_cells):
+    """Score uniques[first_new:] against all uniques.
+
+    Yields (i, j, score) for every off-diagonal pair scoring >= threshold,
+    with i >= first_new.
+    """
+    queries = uniques[first_new:]
+    step = max(1, max_cells // len(uniques))
+    for start in range(0, len(queries), step):
+        scores = process.cdist(
+            queries[start:start + step], uniques,
+            scorer=fuzz.token_sort_ratio, score_cutoff=threshold,
+            dtype=np.float64, workers=-1,
+        )
+        rows, cols = np.nonzero(scores)
+        hits = scores[rows, cols]
+        rows += first_new + start
+        off_diagonal = rows != cols
+        yield rows[off_diagonal], cols[off_diagonal], hits[off_diagonal]
+
+
+def link_block(members, names, uf, best, threshold=85, n_known=0, max_cells=CLUSTER_MAX_CELLS):
+    """Link the records of one DOB block in uf and update their best scores.
+
+    members are row positions, the first n_known of which were already
+    linked among themselves (in an earlier run); only names not seen among
+    them are scored, against every distinct name of the block.
+    """
+    # Identical names are linked directly; only distinct names get scored
+    codes, uniques = pd.factorize(names[members])
+    first_of = [-1] * len(uniques)
+    for member, code in zip(members.tolist(), codes.tolist()):
+        if first_of[code] < 0:
+            first_of[code] = member
+        else:
+            uf.union(first_of[code], member)
+
+    best_of = np.zeros(len(uniques))
+    np.maximum.at(best_of, codes[:n_known], best[members[:n_known]])
+    first_new = int(codes[:n_known].max()) + 1 if n_known else 0
+    if first_new < len(uniques):
+        for rows, cols, hits in _score_names(list(uniques), first_new, threshold, max_cells):
+            for i, j in zip(rows.tolist(), cols.tolist()):
+                uf.union(first_of[i], first_of[j])
+            # The pair's score counts for both sides
+            np.maximum.at(best_of, rows, hits)
+            np.maximum.at(best_of, cols, hits)
+    # A name that occurs more than once scores 100 against its twin
+    best_of[np.bincount(codes, minlength=len(uniques)) > 1] = 100.0
+    best[members] = best_of[codes]
+
+
+def finish_assignments(uf, best, index):
+    """cluster_id / cluster_size / best_score frame from linked positions."""
+    n = len(index)
+    roots = np.array([uf.find(p) for p in range(n)], dtype=np.int64)
+    sizes = np.bincount(roots, minlength=n)[roots]
+    clustered = sizes > 1
+    ids = np.zeros(n, dtype=np.int64)
+    # Roots are first records, so ranking them numbers clusters by first appearance
+    ids[clustered] = pd.factorize(roots[clustered], sort=True)[0] + 1
+    return pd.DataFrame({'cluster_id': ids, 'cluster_size': sizes,
+                         'best_score': np.where(clustered, best, 0.0)}, index=index)
+
+
+def usable_positions(df, name_col, dob_col='dob_day'):
+    """Names array and positions of rows that can be clustered at all
+    (a DOB and a non-empty name)."""
+    names = df[name_col].fillna("").to_numpy(dtype=object)
+    usable = pd.notna(df[dob_col]).to_numpy() & (names != "")
+    return names, np.flatnonzero(usable)
+
+
+def dob_blocks(df, positions, dob_col='dob_day'):
+    """DOB -> positions (ascending) of the given rows sharing that DOB."""
+    dobs = df[dob_col].to_numpy()[positions]
+    blocks = pd.DataFrame({'dob': dobs}).groupby('dob', sort=False).indices
+    return {dob: positions[block] for dob, block in blocks.items()}
+
+
+def cluster_assignments(df, name_col, threshold=85, dob_col='dob_day', max_cells=CLUSTER_MAX_CELLS):
+    """cluster_id, cluster_size and best_score per row of df.
+
+    cluster_id is 0 (size 1) for rows not in any cluster. best_score is the
+    row's highest score against another record of its cluster. Rows with a
+    missing DOB or an empty name are never clustered.
+    """
+    names, positions = usable_positions(df, name_col, dob_col)
+    uf = UnionFind(len(df))
+    best = np.zeros(len(df))
+    for members in dob_blocks(df, positions, dob_col).values():
+        if len(members) > 1:
+            link_block(members, names, uf, best, threshold, max_cells=max_cells)
+    return finish_assignments(uf, best, df.index)
+
+
+def cluster_records(df, name_col, threshold=85, dob_col='dob_day'):
+    """Rows of df that fall in a cluster, with cluster_id, cluster_size and
+    best_score, grouped by cluster in first-appearance order."""
+    assigned = df.join(cluster_assignments(df, name_col, threshold, dob_col))
+    clustered = assigned[assigned['cluster_id'] > 0]
+    return clustered.sort_values('cluster_id', kind='stable')
+
+
+# ---------- Consolidated Cluster Output ---------- #
+# One file per report instead of one CSV per cluster, written in a single
+# pass, plus a small <stem>_summary.csv index with one row per cluster.
+# The partitioned layout is a Parquet dataset directory with one
+# cluster_part=N sub-directory per PARTITION_CLUSTERS consecutive IDs.
+
+PARTITION_CLUSTERS = 10_000
+
+
+def cluster_summary(clustered):
+    """cluster_id, cluster_size, distinct UCICs and lowest best_score per cluster."""
+    summary = clustered.groupby('cluster_id', sort=True).agg(
+        cluster_size=('cluster_size', 'first'),
+        distinct_ucics=('ucic', 'nunique'),
+        min_best_score=('best_score', 'min'),
+    )
+    return summary.reset_index()
+
+
+def write_cluster_report(clustered, stem, fmt='parquet', partitioned=False):
+    """Write all clusters of one report to <stem>.<fmt> (or a partitioned
+    <stem>/ Parquet dataset) and the <stem>_summary.csv index."""
+    if partitioned:
+        parts = clustered.assign(cluster_part=(clustered['cluster_id'] - 1) // PARTITION_CLUSTERS)
+        # Written beside the old dataset and swapped in whole, so a re-run with
+        # fewer clusters leaves no stale cluster_part=N directories behind
+        staging = stem + ".tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        parts.to_parquet(staging, partition_cols=['cluster_part'], index=False)
+        os.makedirs(staging, exist_ok=True)
+        shutil.rmtree(stem, ignore_errors=True)
+        os.replace(staging, stem)
+        paths = [stem]
+    else:
+        paths = write_frame(clustered, stem, fmt)
+    cluster_summary(clustered).to_csv(f"{stem}_summary.csv", index=False)
+    return paths
@@ -0,0 +1,89 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from dup_cluster import UnionFind, dob_blocks, finish_assignments, link_block
+from run_stats import RunStats
+
+# ---------- Single-Pass Duplicate Analysis ---------- #
+# report_new.py's three reports from one pass over the customer frame:
+#   - PAN validity is one regex match over the distinct PANs, mapped back
+#     by code (no Python call per row),
+#   - Report 1 keeps the valid-PAN rows whose PAN has more than one UCIC,
+#     from one groupby-nunique transform instead of a Python filter per
+#     PAN group,
+#   - the invalid-PAN rows are blocked by DOB once, and every block links
+#     its person names (Report 2) and its organization names (Report 3)
+#     while its rows are at hand.
+# Clusters come out exactly as cluster_records gives them on each report's
+# candidate rows: positions keep their relative order, so the first-record
+# roots and the 1..K cluster numbering do not change.
+
+PAN_PATTERN = r'[A-Z]{3}[PCHABGJLFT][A-Z][0-9]{4}[A-Z]'
+# Test / dummy PANs ("AAAAA1234A" ...) are never valid
+DUMMY_PAN_PREFIX = 'AAAAA'
+# Report kind -> normalized column its clusters compare
+CLUSTER_COLUMNS = {'name': 'full_name', 'org': 'organization_name_norm'}
+
+
+def valid_pans(pans):
+    """True per PAN that has the PAN structure and is not a dummy (missing -> False)."""
+    pans = pd.Series(pans)
+    codes, uniques = pd.factorize(pans)
+    text = pd.Series(uniques, dtype=object).astype(str).str.strip().str.upper()
+    valid = text.str.fullmatch(PAN_PATTERN) & ~text.str.startswith(DUMMY_PAN_PREFIX)
+    return pd.Series(np.append(valid.to_numpy(dtype=bool), False)[codes], index=pans.index)
+
+
+def multi_ucic_pans(df):
+    """Rows of df whose PAN maps to more than one UCIC, sorted by PAN and UCIC."""
+    n_ucics = df.groupby('pan')['ucic'].transform('nunique')
+    return df[n_ucics.to_numpy() > 1].sort_values(['pan', 'ucic'])
+
+
+def cluster_reports(df, threshold=85, dob_col='dob_day', stats=None):
+    """cluster_records of df for every CLUSTER_COLUMNS kind, from one pass
+    over df's DOB blocks. Returns kind -> clustered rows."""
+    if stats is None:
+        stats = RunStats('cluster_reports', show_progress=False)
+    names = {kind: df[col].fillna("").to_numpy(dtype=object) for kind, col in CLUSTER_COLUMNS.items()}
+    links = {kind: UnionFind(len(df)) for kind in CLUSTER_COLUMNS}
+    best = {kind: np.zeros(len(df)) for kind in CLUSTER_COLUMNS}
+
+    positions = np.flatnonzero(pd.notna(df[dob_col]).to_numpy())
+    done = 0
+    for dob, block in dob_blocks(df, positions, dob_col).items():
+        done += len(block)
+        for kind in CLUSTER_COLUMNS:
+            # Rows without this kind of name are no candidates for its report
+            members = block[names[kind][block] != ""]
+            if len(members) < 2:
+                continue
+            start = time.perf_counter()
+            link_block(members, names[kind], links[kind], best[kind], threshold)
+            stats.record_block(kind, dob, len(members), len(members), time.perf_counter() - start)
+        stats.progress(done, len(positions))
+
+    clusters = {}
+    for kind in CLUSTER_COLUMNS:
+        assigned = finish_assignments(links[kind], best[kind], df.index)
+        rows = np.flatnonzero(assigned['cluster_id'].to_numpy() > 0)
+        clustered = df.iloc[rows].join(assigned.iloc[rows])
+        clusters[kind] = clustered.sort_values('cluster_id', kind='stable')
+        stats.counts[f'{kind}_clusters'] = int(clustered['cluster_id'].max()) if len(rows) else 0
+    return clusters
+
+
+def duplicate_reports(df, threshold=85, stats=None):
+    """(Report 1, Report 2, Report 3) frames of report_new.py from df with
+    pan_valid, dob_day and the canonical name columns."""
+    if stats is None:
+        stats = RunStats('duplicate_reports', show_progress=False)
+    valid = df['pan_valid'].to_numpy(dtype=bool)
+    with stats.stage("multi-UCIC PANs", rows=int(valid.sum())):
+        multi_ucic_by_pan = multi_ucic_pans(df[valid])
+    with stats.stage("cluster names + orgs", rows=int((~valid).sum())):
+        clusters = cluster_reports(df[~valid], threshold, stats=stats)
+    stats.counts['multi_ucic_pan_rows'] = len(multi_ucic_by_pan)
+    return multi_ucic_by_pan, clusters['name'], clusters['org']
@@ -0,0 +1,143 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from dup_cluster import UnionFind, dob_blocks, finish_assignments, link_block, usable_positions
+from state_files import read_meta, save_stamped
+
+# ---------- Incremental Duplicate Detection ---------- #
+# Cluster links never cross DOB blocks, so a run only has to rescore the
+# blocks the delta touches. Each record is identified by a hash of its row
+# content; the state saved after a run keeps every clustered-candidate
+# record's key, DOB, name, component and best score.
+# Next run:
+#   - blocks that only gained records keep their old components and score
+#     just the new distinct names against the block (attach / merge),
+#   - blocks that lost or changed a record are re-clustered from scratch,
+#   - untouched blocks are taken over as they are.
+# The result equals a full recompute. Report 1 keeps the (key, PAN, UCIC)
+# rows and the multi-UCIC PAN set and only re-checks PANs the delta touches.
+
+STATE_DIR = ".dup_state"
+
+
+def record_keys(df):
+    """Stable uint64 key per row: its content hash plus its occurrence
+    number among identical rows."""
+    row_hash = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    occurrence = pd.Series(row_hash).groupby(row_hash).cumcount().to_numpy()
+    keys = pd.util.hash_pandas_object(pd.DataFrame({'h': row_hash, 'n': occurrence}), index=False)
+    return pd.Series(keys.to_numpy(), index=df.index, name='record_key')
+
+
+def _state_paths(state_path):
+    return state_path, state_path + ".meta.json"
+
+
+def _load_state(state_path, meta):
+    if read_meta(_state_paths(state_path)) != meta:
+        return None
+    return pd.read_parquet(state_path)
+
+
+def _save_state(state_path, state, meta):
+    save_stamped(_state_paths(state_path), lambda path: state.to_parquet(path, index=False), meta)
+
+
+def incremental_cluster_assignments(df, keys, name_col, state_path, threshold=85, dob_col='dob_day'):
+    """cluster_assignments for df, reusing and then refreshing the saved state."""
+    meta = {'name_col': name_col, 'threshold': threshold, 'dob_col': dob_col}
+    names, positions = usable_positions(df, name_col, dob_col)
+    uf = UnionFind(len(df))
+    best = np.zeros(len(df))
+    current = pd.DataFrame({'key': keys.to_numpy()[positions], 'pos': positions,
+                            'name': names[positions]})
+
+    state = _load_state(state_path, meta)
+    if state is None:
+        print(f"🧮 No usable state at {state_path}, clustering {name_col} in full")
+        state = pd.DataFrame({'key': pd.Series(dtype=np.uint64), 'dob': [], 'name': [],
+                              'comp': pd.Series(dtype=np.int64), 'best': pd.Series(dtype=float)})
+
+    known = current.merge(state, on='key', how='inner', suffixes=('', '_old'))
+    changed = known['name'] != known['name_old']
+    gone = state[~state['key'].isin(current['key'])]
+    # Blocks that lost (or saw a changed) record are re-clustered from scratch
+    dirty = set(gone['dob']) | set(known.loc[changed, 'dob'])
+    keep = known[~changed & ~known['dob'].isin(dirty)]
+
+    keep_pos = keep['pos'].to_numpy()
+    best[keep_pos] = keep['best'].to_numpy()
+    comps = keep['comp'].to_numpy()
+    order = np.argsort(comps, kind='stable')
+    first_of_comp = {}
+    for comp, pos in zip(comps[order].tolist(), keep_pos[order].tolist()):
+        if comp in first_of_comp:
+            uf.union(first_of_comp[comp], pos)
+        else:
+            first_of_comp[comp] = pos
+
+    is_kept = np.zeros(len(df), dtype=bool)
+    is_kept[keep_pos] = True
+    rescored = 0
+    for dob, members in dob_blocks(df, positions, dob_col).items():
+        is_known = is_kept[members]
+        if is_known.all() or len(members) < 2:
+            continue
+        rescored += 1
+        ordered = np.concatenate([members[is_known], members[~is_known]])
+        link_block(ordered, names, uf, best, threshold, n_known=int(is_known.sum()))
+
+    n_new = len(current) - len(keep)
+    print(f"🧮 {name_col}: {n_new} new/changed, {len(gone)} removed records, {rescored} DOB blocks rescored")
+
+    assigned = finish_assignments(uf, best, df.index)
+    roots = np.array([uf.find(p) for p in positions], dtype=np.int64)
+    _save_state(state_path, pd.DataFrame({
+        'key': current['key'].to_numpy(),
+        'dob': df[dob_col].to_numpy()[positions],
+        'name': current['name'].to_numpy(),
+        'comp': roots,
+        'best': best[positions],
+    }), meta)
+    return assigned
+
+
+def incremental_cluster_records(df, keys, name_col, state_path, threshold=85, dob_col='dob_day'):
+    """cluster_records, computed incrementally against state_path."""
+    assigned = df.join(incremental_cluster_assignments(df, keys, name_col, state_path, threshold, dob_col))
+    clustered = assigned[assigned['cluster_id'] > 0]
+    return clustered.sort_values('cluster_id', kind='stable')
+
+
+def incremental_multi_ucic_pans(df, keys, state_path):
+    """Rows of df (valid PANs only) whose PAN maps to more than one UCIC,
+    sorted by PAN and UCIC; only PANs touched since the last run are
+    re-checked."""
+    meta = {'report': 'multi_ucic_by_pan'}
+    current = pd.DataFrame({'key': keys.to_numpy(), 'pan': df['pan'].to_numpy(),
+                            'ucic': df['ucic'].to_numpy()})
+    state = _load_state(state_path, meta)
+    multi_path = state_path + ".multi.json"
+    if state is None or not os.path.exists(multi_path):
+        touched = set(current['pan'])
+        multi = set()
+    else:
+        with open(multi_path) as f:
+            multi = set(json.load(f))
+        added = current[~current['key'].isin(state['key'])]
+        gone = state[~state['key'].isin(current['key'])]
+        touched = set(added['pan']) | set(gone['pan'])
+
+    # Re-check only the touched PANs against the current rows
+    recheck = current[current['pan'].isin(touched)]
+    n_ucics = recheck.groupby('pan')['ucic'].nunique()
+    multi = (multi - touched) | set(n_ucics.index[n_ucics > 1])
+    print(f"🧮 PAN: {len(touched)} PANs re-checked, {len(multi)} with multiple UCICs")
+
+    _save_state(state_path, current, meta)
+    with open(multi_path, 'w') as f:
+        json.dump(sorted(multi), f)
+    return df[df['pan'].isin(multi)].sort_values(['pan', 'ucic'])
@@ -1,59 +1,44 @@
 import pandas as pd
-from decimal import Decimal, ROUND_HALF_UP
-
-# Step 1: Load your data (replace this with your actual source)
-# Example: df = pd.read_csv("your_file.csv")
-
-# Step 2: Parse Advice Date (format: DD-MM-YY) and Allocation Date (format: YYYY-MM-DD)
-df['Advice Date'] = pd.to_datetime(df['Advice Date'], format='%d-%m-%y', errors='coerce')
-df['Allocation Date'] = pd.to_datetime(df['Allocation Date'], format='%Y-%m-%d', errors='coerce')
-
-# Step 3: Create Month-Year columns
-df['Advice_MonthYear'] = df['Advice Date'].dt.strftime('%b-%Y')  # e.g., 'Mar-2024'
-df['Allocation_MonthYear'] = df['Allocation Date'].dt.strftime('%b-%Y')
-
-# Step 4: Filter and deduplicate dues by Advice Ref# (to avoid overcounting partial payments)
-due_df = (
-    df[df['Charge_Code_due'] == 9]
-    .drop_duplicates(subset=['LOANACCTNO', 'Advice Ref#'])  # One due per advice
-    .groupby(['LOANACCTNO', 'Advice_MonthYear'], as_index=False)
-    .agg({'DueAmount': 'sum'})
-    .rename(columns={'Advice_MonthYear': 'MonthYear'})
-)
-
-# Step 5: Aggregate collected amounts by Allocation Date
-collected_df = (
-    df.groupby(['LOANACCTNO', 'Allocation_MonthYear'], as_index=False)
-    .agg({'Collected Amount': 'sum'})
-    .rename(columns={'Allocation_MonthYear': 'MonthYear'})
-)
-
-# Step 6: Round values to 2 decimal places using Decimal to avoid floating-point errors
-def to_fixed_str(val):
-    return str(Decimal(val).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
-
-due_df['DueAmount'] = due_df['DueAmount'].apply(to_fixed_str)
-collected_df['Collected Amount'] = collected_df['Collected Amount'].apply(to_fixed_str)
-
-# Step 7: Prepare full keys to ensure all LOANACCTNO-MonthYear combinations are captured
-all_keys = pd.concat([
-    due_df[['LOANACCTNO', 'MonthYear']],
-    collected_df[['LOANACCTNO', 'MonthYear']]
-]).drop_duplicates()
-
-# Step 8: Merge dues and collections
-final_df = all_keys.merge(due_df, on=['LOANACCTNO', 'MonthYear'], how='left')
-final_df = final_df.merge(collected_df, on=['LOANACCTNO', 'MonthYear'], how='left')
-
-# Step 9: Fill NaN with "0.00" (as string for consistency)
-final_df['DueAmount'] = final_df['DueAmount'].fillna('0.00')
-final_df['Collected Amount'] = final_df['Collected Amount'].fillna('0.00')
-
-# Step 10: Sort by MonthYear and LOANACCTNO
-final_df['MonthYear_sort'] = pd.to_datetime(final_df['MonthYear'], format='%b-%Y', errors='coerce')
-final_df = final_df.sort_values(by=['MonthYear_sort', 'LOANACCTNO']).drop(columns='MonthYear_sort')
-
-# Step 11: Save to CSV with exact decimals
+from money import format_amounts, parse_amounts
+from report_parallel import due_collected_table
+from source_loader import load_source
+
+# Processes for the due / collected aggregation (1 = serial; more split the accounts over a
+# pool where the platform can fork, serial otherwise)
+WORKERS = 1
+
+# Step 1: Load your data (replace the path with your actual source). The 'ledger' schema in
+# source_loader.py maps column aliases, reads only the needed columns and parses Advice Date
+# (DD-MM-YY) and Allocation Date (YYYY-MM-DD); repeat runs read a cached Parquet copy
+df = load_source("your_file.csv", "ledger")
+
+# Step 2: Month keys as monthly periods (int64 underneath, sort chronologically;
+# the 'Mar-2024' labels are only rendered for the output)
+df['Advice_Month'] = df['Advice Date'].dt.to_period('M')
+df['Allocation_Month'] = df['Allocation Date'].dt.to_period('M')
+
+# Step 3: LOANACCTNO as integer codes in sorted order (rows without one are never reported)
+df['LAN_code'], loans = pd.factorize(df['LOANACCTNO'], sort=True)
+df = df[df['LAN_code'] >= 0]
+
+# Step 4: Amounts as int64 fixed-point units (exact integer sums, no floating-point error;
+# only the totals are rounded to paise)
+df['DueAmount'] = parse_amounts(df['DueAmount'])
+df['Collected Amount'] = parse_amounts(df['Collected Amount'])
+
+# Step 5: Dues deduplicated by Advice Ref# (to avoid overcounting partial payments) and
+# collections per (LAN_code, Month) in one aligned outer combine, sorted by month, then
+# LOANACCTNO (codes follow the sorted account numbers); keys without dues / collections get 0
+final_df = due_collected_table(df, workers=WORKERS, dedup_advices=True)
+final_df = final_df.astype({'DueAmount': 'int64', 'Collected Amount': 'int64'})
+
+# Step 6: Render account numbers, 'Mar-2024' labels and totals rounded half-up to 2 decimals, and save
+final_df = pd.DataFrame({
+    'LOANACCTNO': loans[final_df['LAN_code'].to_numpy()],
+    'MonthYear': final_df['Month'].dt.strftime('%b-%Y').to_numpy(),
+    'DueAmount': format_amounts(final_df['DueAmount']),
+    'Collected Amount': format_amounts(final_df['Collected Amount']),
+})
 final_df.to_csv('final_report.csv', index=False)
 
 # Optional: View result
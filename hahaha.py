@@ -1,5 +1,5 @@
 import pandas as pd
-from decimal import Decimal, ROUND_HALF_UP
+from money import format_amounts, parse_amounts
 
 # -- Load your dataframe
 # df = pd.read_csv("your_file.csv")
@@ -8,54 +8,45 @@ from decimal import Decimal, ROUND_HALF_UP
 df['Advice Date'] = pd.to_datetime(df['Advice Date'], format='%d-%m-%y', errors='coerce')
 df['Allocation Date'] = pd.to_datetime(df['Allocation Date'], format='%Y-%m-%d', errors='coerce')
 
-# Create month-year columns
-df['Advice_MonthYear'] = df['Advice Date'].dt.strftime('%b-%Y')
-df['Allocation_MonthYear'] = df['Allocation Date'].dt.strftime('%b-%Y')
+# Monthly period keys (labels rendered at export only)
+df['Advice_Month'] = df['Advice Date'].dt.to_period('M')
+df['Allocation_Month'] = df['Allocation Date'].dt.to_period('M')
+
+# LOANACCTNO as sorted integer codes; rows without one never reach the report
+df['LAN_code'], loans = pd.factorize(df['LOANACCTNO'], sort=True)
+df = df[df['LAN_code'] >= 0]
+
+# Amounts as int64 fixed-point units: exact sums, rounded to paise only at export
+df['DueAmount'] = parse_amounts(df['DueAmount'])
+df['Collected Amount'] = parse_amounts(df['Collected Amount'])
 
 # Filter and deduplicate due rows by Advice Ref#
-due_df = (
+due = (
     df[df['Charge_Code_due'] == 9]
     .drop_duplicates(subset=['LOANACCTNO', 'Advice Ref#'])
-    .groupby(['LOANACCTNO', 'Advice_MonthYear'], as_index=False)
-    .agg({'DueAmount': 'sum'})
-    .rename(columns={'Advice_MonthYear': 'MonthYear'})
+    .groupby(['LAN_code', 'Advice_Month'])['DueAmount'].sum()
+    .rename_axis(['LAN_code', 'Month'])
 )
 
 # Collected amounts grouped by allocation month
-collected_df = (
-    df.groupby(['LOANACCTNO', 'Allocation_MonthYear'], as_index=False)
-    .agg({'Collected Amount': 'sum'})
-    .rename(columns={'Allocation_MonthYear': 'MonthYear'})
+collected = (
+    df.groupby(['LAN_code', 'Allocation_Month'])['Collected Amount'].sum()
+    .rename_axis(['LAN_code', 'Month'])
 )
 
-# Round with Decimal and convert to fixed string format
-def to_fixed_str(val):
-    return format(Decimal(val).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP), '.2f')
-
-due_df['DueAmount'] = due_df['DueAmount'].apply(to_fixed_str)
-collected_df['Collected Amount'] = collected_df['Collected Amount'].apply(to_fixed_str)
-
-# Ensure full key space is retained
-all_keys = pd.concat([
-    due_df[['LOANACCTNO', 'MonthYear']],
-    collected_df[['LOANACCTNO', 'MonthYear']]
-]).drop_duplicates()
-
-# Merge the two
-final_df = all_keys.merge(due_df, on=['LOANACCTNO', 'MonthYear'], how='left')
-final_df = final_df.merge(collected_df, on=['LOANACCTNO', 'MonthYear'], how='left')
-
-# Fill missing values with "0.00" (string)
-final_df['DueAmount'] = final_df['DueAmount'].fillna('0.00')
-final_df['Collected Amount'] = final_df['Collected Amount'].fillna('0.00')
+# Single outer combine keeps the full key space (nullable, so sums never pass through float); missing sides are 0
+final_df = pd.concat([due.astype('Int64'), collected.astype('Int64')], axis=1).fillna(0).astype('int64')
 
-# Sort properly
-final_df['MonthYear_sort'] = pd.to_datetime(final_df['MonthYear'], format='%b-%Y', errors='coerce')
-final_df = final_df.sort_values(by=['MonthYear_sort', 'LOANACCTNO']).drop(columns='MonthYear_sort')
+# Sort properly: month first, then LOANACCTNO
+final_df = final_df.sort_index(level=['Month', 'LAN_code']).reset_index()
 
-# Final step: force all numeric columns to string before CSV export
-final_df['DueAmount'] = final_df['DueAmount'].astype(str)
-final_df['Collected Amount'] = final_df['Collected Amount'].astype(str)
+# Final step: account numbers, 'Mar-2024' labels and totals -> fixed 2-decimal strings (ROUND_HALF_UP)
+final_df = pd.DataFrame({
+    'LOANACCTNO': loans[final_df['LAN_code'].to_numpy()],
+    'MonthYear': final_df['Month'].dt.strftime('%b-%Y').to_numpy(),
+    'DueAmount': format_amounts(final_df['DueAmount']),
+    'Collected Amount': format_amounts(final_df['Collected Amount']),
+})
 
 # Save to CSV WITHOUT letting float formatting creep in
 final_df.to_csv('final_report.csv', index=False, quoting=1)  # quoting=1 forces quotes around text/numbers
@@ -0,0 +1,90 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+import pandas as pd
+
+# ---------- Fixed-Point Money ---------- #
+# Amounts are int64 fixed-point from parse to write: each amount is held in
+# units of 10^-AMOUNT_DECIMALS rupees (sub-paise, so an amount like 0.333 or
+# 0.005 keeps its digits), sums are exact integer sums, and only the total
+# is rounded ROUND_HALF_UP to paise, once, at write time (0.333 x 3 ->
+# "1.00", 0.005 + 0.005 -> "0.01", 2.675 -> "2.68").
+# Amounts are read by the C number parser; for anything with at most
+# AMOUNT_DECIMALS decimals (up to ~1e9 rupees) x * AMOUNT_SCALE lands within
+# float error of the exact units, so rounding it is exact. The rare values
+# with more digits after the point are re-read with Decimal from their
+# shortest repr, which gives back the source text's digits, and rounded
+# ROUND_HALF_UP to units from there. int64 sums stay exact up to ~9e12 rupees.
+
+AMOUNT_DECIMALS = 6
+AMOUNT_SCALE = 10 ** AMOUNT_DECIMALS
+# Units per paise, the step totals are rounded to
+PAISE_UNITS = AMOUNT_SCALE // 100
+
+# x * AMOUNT_SCALE further than this many float steps from a whole number of
+# units means more than AMOUNT_DECIMALS decimals
+UNIT_ULPS = 8
+
+
+def _decimal_units(amount):
+    quantum = Decimal(1).scaleb(-AMOUNT_DECIMALS)
+    return int(Decimal(repr(amount)).quantize(quantum, rounding=ROUND_HALF_UP).scaleb(AMOUNT_DECIMALS))
+
+
+def _warnings(unparseable, rounded):
+    lines = []
+    if unparseable:
+        lines.append(f"⚠️  {unparseable} amounts could not be parsed; counted as 0.00")
+    if rounded:
+        lines.append(f"⚠️  {rounded} amounts had more than {AMOUNT_DECIMALS} decimals; "
+                     f"rounded half-up to {AMOUNT_DECIMALS}")
+    return lines
+
+
+def print_amount_warnings(stats):
+    """Print the parse warnings parse_amounts tallied in stats (a RunStats), once per run."""
+    counts = stats.tallies.get('amounts', {})
+    for line in _warnings(counts.get('unparseable', 0), counts.get('rounded', 0)):
+        print(line)
+
+
+def parse_amounts(values, stats=None):
+    """int64 fixed-point units (AMOUNT_SCALE per rupee) per amount (numbers
+    or numeric text); missing / unparseable -> 0.
+
+    Parse warnings are printed, or with stats (a RunStats) tallied for
+    print_amount_warnings, for callers that parse chunk by chunk.
+    """
+    values = pd.Series(values)
+    unparseable = 0
+    if pd.api.types.is_numeric_dtype(values):
+        amounts = values.to_numpy(dtype=np.float64)
+    else:
+        amounts = pd.to_numeric(values.astype(str).str.strip(), errors='coerce').to_numpy(dtype=np.float64)
+        text = values.astype(str).str.strip()
+        unparseable = int((values.notna() & (text != "")).to_numpy().sum() - (~np.isnan(amounts)).sum())
+    amounts = np.where(np.isfinite(amounts), amounts, 0.0)
+    scaled = amounts * AMOUNT_SCALE
+    units = np.rint(scaled).astype(np.int64)
+    extra = np.abs(scaled - np.rint(scaled)) > UNIT_ULPS * np.spacing(np.abs(scaled))
+    if extra.any():
+        units[extra] = [_decimal_units(amount) for amount in amounts[extra].tolist()]
+    if stats is None:
+        for line in _warnings(unparseable, int(extra.sum())):
+            print(line)
+    else:
+        stats.tally('amounts', {'unparseable': unparseable, 'rounded': int(extra.sum())})
+    return pd.Series(units, index=values.index)
+
+
+def format_amounts(units):
+    """"1234.56"-style text per int64 unit total, rounded ROUND_HALF_UP to
+    paise (what str() of a Decimal quantized to 0.01 gives)."""
+    units = np.asarray(units, dtype=np.int64)
+    # Halves away from zero, on the magnitude
+    paise = (np.abs(units) + PAISE_UNITS // 2) // PAISE_UNITS
+    whole = pd.Series(paise // 100).astype(str)
+    cents = pd.Series(paise % 100).astype(str).str.zfill(2)
+    # Decimal keeps the sign of a total that rounds to zero ("-0.00")
+    sign = np.where(units < 0, "-", "")
+    return (sign + whole + "." + cents).to_numpy(dtype=object)
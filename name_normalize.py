@@ -0,0 +1,87 @@
+import re
+
+import numpy as np
+import pandas as pd
+import unidecode
+
+# ---------- Shared Name Normalization ---------- #
+# Name columns repeat heavily (surnames, "PVT LTD", ...), so every
+# normalization here factorizes the column, works on the distinct values
+# only with vectorized string ops, and maps the result back by code.
+# Canonical names (lower case, transliterated to ASCII, letters and single
+# spaces only) are additionally kept in a bounded cache across calls, so the
+# master, the new file and every streamed chunk share the work.
+
+NAME_CACHE_SIZE = 1_000_000
+
+_canonical_cache = {}
+
+
+def _map_unique(values, transform):
+    """Apply transform (Series -> Series) to the distinct values only."""
+    values = pd.Series(values)
+    codes, uniques = pd.factorize(values)
+    result = transform(pd.Series(uniques, dtype=object)).to_numpy(dtype=object)
+    # Missing values (code -1) come out as ""
+    return pd.Series(np.append(result, "")[codes], index=values.index, dtype=object).infer_objects()
+
+
+def clean_text(values):
+    """Strip and upper-case a text column (missing -> "")."""
+    return _map_unique(values, lambda u: u.astype(str).str.strip().str.upper())
+
+
+def _canonical(uniques):
+    names = uniques.astype(str).str.lower()
+    # unidecode only where there is something to transliterate
+    non_ascii = ~names.str.isascii()
+    names[non_ascii] = names[non_ascii].map(unidecode.unidecode)
+    names = names.str.replace(r'[^a-z\s]', '', regex=True)
+    return names.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+
+def _canonical_cached(uniques):
+    cached = uniques.map(_canonical_cache.get)
+    misses = cached.isna()
+    if misses.any():
+        fresh = _canonical(uniques[misses])
+        cached[misses] = fresh
+        if len(_canonical_cache) + len(fresh) > NAME_CACHE_SIZE:
+            _canonical_cache.clear()
+        _canonical_cache.update(zip(uniques[misses], fresh))
+    return cached
+
+
+_NON_LETTERS = re.compile(r'[^a-z\s]')
+_SPACES = re.compile(r'\s+')
+
+
+def canonical_name(value):
+    """Canonical form of one name (same rules as canonical_names), for
+    single-record lookups where a pandas round trip costs more than the work."""
+    if not isinstance(value, str):
+        return ""
+    cached = _canonical_cache.get(value)
+    if cached is None:
+        name = value.lower()
+        if not name.isascii():
+            name = unidecode.unidecode(name)
+        cached = _SPACES.sub(' ', _NON_LETTERS.sub('', name)).strip()
+        if len(_canonical_cache) >= NAME_CACHE_SIZE:
+            _canonical_cache.clear()
+        _canonical_cache[value] = cached
+    return cached
+
+
+def canonical_names(values):
+    """Canonical form of a name column (missing -> "")."""
+    return _map_unique(values, _canonical_cached)
+
+
+def add_canonical_names(df):
+    """Add first_name_norm, last_name_norm, organization_name_norm and
+    full_name (the name/org columns both matchers and reports compare)."""
+    for col in ['first_name', 'last_name', 'organization_name']:
+        df[f'{col}_norm'] = canonical_names(df[col]) if col in df.columns else ""
+    df['full_name'] = (df['first_name_norm'] + ' ' + df['last_name_norm']).str.strip()
+    return df
@@ -1,90 +1,90 @@
+import argparse
 import pandas as pd
 import numpy as np
 import re
 from datetime import datetime
-from rapidfuzz import process, fuzz
-
-def load_and_clean_data():
-    df_master = pd.read_csv("UCIC_Dump.csv", dtype=str)
-    df_new = pd.read_excel("ucic_02-62025.xlsx", dtype=str)
-
-    df_master.columns = df_master.columns.str.lower().str.strip()
-    df_new.columns = df_new.columns.str.lower().str.strip()
-
-    for df in [df_master, df_new]:
-        df.fillna("", inplace=True)
-        dob_col = 'dob' if 'dob' in df.columns else 'birth_date'
-        df['dob'] = pd.to_datetime(df[dob_col], errors='coerce', dayfirst=True).dt.date
-        df['first_name'] = df.get('first_name', '').str.strip().str.upper()
-        df['last_name'] = df.get('last_name', '').str.strip().str.upper()
-        df['organization_name'] = df.get('organization_name', '').str.strip().str.upper()
-        df['pan'] = df.get('pan', '').str.strip().str.upper()
-        df['aadhar_no'] = df.get('aadhar_no', '').astype(str).str.extract(r'(\d{4})$', expand=False).fillna("")
-        df['party_tc'] = df.get('party_tc', '').str.strip().str.upper()
-        df['ucic'] = df.get('ucic', '').str.strip()
-
-    return df_master, df_new
+from output_writers import OUTPUT_FORMATS, open_output, write_frame
+from run_stats import RunStats, profile
+from source_loader import load_source
+from ucic_cache import load_master
+from ucic_clean import clean_ucic_frame
+from ucic_index import MasterIndex, best_fuzzy_match, match_batch, split_matches
+from ucic_parallel import match_sharded
+from ucic_stream import CHUNK_ROWS, OUTPUT_COLUMN_TYPES, match_stream
+
+def load_and_clean_data(stats=None):
+    stats = stats or RunStats('load_and_clean_data', show_progress=False)
+    # Compact master store + its index come from the on-disk cache when valid
+    master, index = load_master("UCIC_Dump.csv", stats=stats)
+    # All-text read of the new file, from its Parquet cache while the workbook is unchanged
+    raw = load_source("ucic_02-62025.xlsx", "ucic_new", stats=stats)
+    with stats.stage("clean new file", rows=len(raw)):
+        df_new = clean_ucic_frame(raw)
+
+    return master, df_new, index
 
 
 def is_valid_pan(pan):
     return bool(re.match(r'^[A-Z]{5}[0-9]{4}[A-Z]$', pan))
 
 
-def find_ucic_match_fast(row, master_persons, master_orgs):
+def find_ucic_match_fast(row, index):
     pan = row.get('pan', '')
-    dob = row.get('dob')
+    dob = row.get('dob_day')
     aadhar = row.get('aadhar_no')
-    first_name = row.get('first_name', '')
-    last_name = row.get('last_name', '')
-    full_name = f"{first_name} {last_name}".strip()
-    org_name = row.get('organization_name', '')
+    full_name = row.get('full_name', '')
+    org_name = row.get('organization_name_norm', '')
     party_tc = row.get('party_tc', '')
 
     # 1. PAN match
     if pan and is_valid_pan(pan):
-        match = master_persons[master_persons['pan'] == pan]
-        if not match.empty:
-            return match.iloc[0]['ucic']
+        ucic = index.lookup_pan(pan, persons_only=True)
+        if ucic is not None:
+            return ucic
 
     # Person Logic
     if party_tc == "PERSON":
-        candidates = master_persons[master_persons['dob'] == dob]
-
         # 2. Aadhar + DOB match
         if aadhar:
-            match = candidates[candidates['aadhar_no'] == aadhar]
-            if not match.empty:
-                return match.iloc[0]['ucic']
+            ucic = index.lookup_aadhar_dob(aadhar, dob)
+            if ucic is not None:
+                return ucic
 
-        # 3. Fuzzy Name Match
-        names_list = candidates.apply(lambda x: f"{x['first_name']} {x['last_name']}", axis=1).tolist()
-        if names_list:
-            match, score, idx = process.extractOne(full_name, names_list, scorer=fuzz.token_sort_ratio)
-            if score >= 90:
-                return candidates.iloc[idx]['ucic']
+        # 3. Fuzzy Name Match (over the whole master when there is no usable DOB)
+        if pd.isna(dob):
+            return index.lookup_name(full_name, person=True)
+        return best_fuzzy_match(full_name, index.person_block(dob))
 
     # Organization Logic
     else:
-        candidates = master_orgs[master_orgs['dob'] == dob]
-        org_list = candidates['organization_name'].tolist()
-        if org_name and org_list:
-            match, score, idx = process.extractOne(org_name, org_list, scorer=fuzz.token_sort_ratio)
-            if score >= 90:
-                return candidates.iloc[idx]['ucic']
+        if org_name and pd.isna(dob):
+            return index.lookup_name(org_name, person=False)
+        if org_name:
+            return best_fuzzy_match(org_name, index.org_block(dob))
 
     return None
 
 
-def match_all(df_master, df_new):
-    matched, unmatched = [], []
+def match_all(master, df_new, index=None, batch=False, workers=1, stats=None):
+    stats = stats or RunStats('match_all')
+    if index is None:
+        with stats.stage("build index"):
+            index = MasterIndex.from_frame(master)
+
+    if workers > 1:
+        # Build the no-DOB name indexes once, before the workers fork
+        index.name_index(True), index.name_index(False)
+        # DOB-hash shards over a process pool, merged back in input order
+        return split_matches(df_new, match_sharded(df_new, index, workers, stats=stats, dob_fallback=True))
 
-    master_persons = df_master[df_master['party_tc'] == 'PERSON']
-    master_orgs = df_master[df_master['party_tc'] != 'PERSON']
-    master_persons = master_persons[master_persons['ucic'] != '']
-    master_orgs = master_orgs[master_orgs['ucic'] != '']
+    if batch:
+        # Whole-frame rules + one cdist per (party type, DOB) block
+        return split_matches(df_new, match_batch(df_new, index, stats=stats, dob_fallback=True))
+
+    matched, unmatched = [], []
 
     for i, row in df_new.iterrows():
-        ucic = find_ucic_match_fast(row, master_persons, master_orgs)
+        ucic = find_ucic_match_fast(row, index)
         rec = row.to_dict()
         if ucic:
             rec['matched_ucic'] = ucic
@@ -92,24 +92,55 @@ def match_all(df_master, df_new):
         else:
             unmatched.append(rec)
 
-        if (i+1) % 5000 == 0:
-            print(f"Processed {i+1} rows...")
+        stats.progress(i + 1, len(df_new))
 
     return pd.DataFrame(matched), pd.DataFrame(unmatched)
 
 
-def generate_reports(matched_df, unmatched_df):
-    matched_df.to_excel("matched_ucics.xlsx", index=False)
-    unmatched_df.to_excel("unmatched_ucics.xlsx", index=False)
+def generate_reports(matched_df, unmatched_df, fmt="xlsx"):
+    # Streaming writers: constant memory, sheet rollover past Excel's row limit
+    write_frame(matched_df, "matched_ucics", fmt)
+    write_frame(unmatched_df, "unmatched_ucics", fmt)
     print("\n✅ Matching complete.")
     print(f"🔍 Matched: {len(matched_df)}")
     print(f"❌ Unmatched: {len(unmatched_df)}")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Match new customers to existing UCICs")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for sharded matching")
+    parser.add_argument("--stream", action="store_true", help="read, match and write the new file in chunks")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS, help="rows per chunk in --stream mode")
+    parser.add_argument("--input", default="ucic_02-62025.xlsx", help="new-customer file (.xlsx or .csv) for --stream")
+    parser.add_argument("--format", default="xlsx", choices=OUTPUT_FORMATS, help="output file format")
+    parser.add_argument("--summary", default="match_all_summary.json", help="JSON run summary path")
+    parser.add_argument("--profile", action="store_true", help="cProfile the matching stage (match_all.prof)")
+    args = parser.parse_args()
+    stats = RunStats('match_all')
+
+    if args.stream:
+        print("🚀 Loading master...")
+        master, index = load_master("UCIC_Dump.csv", stats=stats)
+        print("🔎 Streaming and matching UCICs...")
+        with open_output("matched_ucics", args.format, OUTPUT_COLUMN_TYPES) as matched_out, \
+                open_output("unmatched_ucics", args.format, OUTPUT_COLUMN_TYPES) as unmatched_out, \
+                profile(args.profile, "match_all.prof"):
+            n_matched, n_unmatched = match_stream(args.input, index, matched_out, unmatched_out,
+                                                  chunksize=args.chunksize, stats=stats, dob_fallback=True)
+        print("\n✅ Matching complete.")
+        print(f"🔍 Matched: {n_matched}")
+        print(f"❌ Unmatched: {n_unmatched}")
+        stats.counts.update(new_rows=n_matched + n_unmatched, matched=n_matched, unmatched=n_unmatched)
+        stats.write_summary(args.summary)
+        raise SystemExit
+
     print("🚀 Loading data...")
-    df_master, df_new = load_and_clean_data()
+    master, df_new, index = load_and_clean_data(stats)
     print("🔎 Matching UCICs...")
-    matched_df, unmatched_df = match_all(df_master, df_new)
+    with stats.stage("match", rows=len(df_new)), profile(args.profile, "match_all.prof"):
+        matched_df, unmatched_df = match_all(master, df_new, index, batch=True, workers=args.workers, stats=stats)
     print("📁 Saving output...")
-    generate_reports(matched_df, unmatched_df)
+    with stats.stage("export", rows=len(df_new)):
+        generate_reports(matched_df, unmatched_df, args.format)
+    stats.counts.update(new_rows=len(df_new), matched=len(matched_df), unmatched=len(unmatched_df))
+    stats.write_summary(args.summary)
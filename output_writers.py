@@ -0,0 +1,201 @@
+from abc import ABC, abstractmethod
+
+# ---------- Streaming Output Writers ---------- #
+# Row sinks that accept DataFrames incrementally (write() per chunk) and keep
+# memory constant: CSV appends, Parquet writes one row group per chunk and
+# Excel uses openpyxl's write-only mode, rolling over to a new sheet at the
+# 1,048,576-row sheet limit (and optionally to a new file every N sheets).
+# Parquet needs pyarrow.
+
+OUTPUT_FORMATS = ('xlsx', 'csv', 'parquet')
+
+EXCEL_MAX_ROWS = 1_048_576
+
+# Rows converted to Python objects at a time when feeding openpyxl
+EXCEL_SLICE_ROWS = 10_000
+
+
+class _Output(ABC):
+
+    def __init__(self, stem):
+        self.stem = stem
+        self.rows = 0
+        self.paths = []
+
+    @abstractmethod
+    def write(self, df):
+        """Append the rows of df."""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvOutput(_Output):
+
+    def __init__(self, stem):
+        super().__init__(stem)
+        self.paths.append(f"{stem}.csv")
+        self._header_written = False
+
+    def write(self, df):
+        df.to_csv(self.paths[0], mode='a' if self._header_written else 'w',
+                  header=not self._header_written, index=False)
+        self._header_written = True
+        self.rows += len(df)
+
+    def close(self):
+        # A sink that never saw a frame still leaves an (empty) file behind
+        if not self._header_written:
+            open(self.paths[0], 'w').close()
+
+
+class ParquetOutput(_Output):
+    """Parquet sink; the file schema is fixed by the first chunk with rows.
+
+    column_types (column -> Arrow type alias such as 'date32' or 'string')
+    declares columns whose type that chunk cannot show, e.g. an object
+    column that happens to be all-null there. Undeclared all-null columns
+    stay Arrow null, and later values in them are an error rather than a
+    guessed type. A sink that never gets a frame writes a row-less file with
+    just the column_types columns.
+    """
+
+    def __init__(self, stem, column_types=None):
+        super().__init__(stem)
+        self.paths.append(f"{stem}.parquet")
+        self.column_types = column_types or {}
+        self._writer = None
+        self._schema = None
+        self._empty = None
+
+    def _schema_for(self, df):
+        import pyarrow as pa
+
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        for name, alias in self.column_types.items():
+            i = schema.get_field_index(name)
+            if i >= 0:
+                schema = schema.set(i, schema.field(i).with_type(pa.type_for_alias(alias)))
+        return schema
+
+    def _open(self, df):
+        import pyarrow.parquet as pq
+
+        self._schema = self._schema_for(df)
+        self._writer = pq.ParquetWriter(self.paths[0], self._schema)
+
+    def write(self, df):
+        import pyarrow as pa
+
+        if self._writer is None:
+            if len(df) == 0:
+                # An empty chunk shows no value types; keep it only for an all-empty output
+                self._empty = df
+                return
+            self._open(df)
+        else:
+            for field in self._schema:
+                if pa.types.is_null(field.type) and df[field.name].notna().any():
+                    raise ValueError(f"{self.paths[0]}: column {field.name!r} was all-null when the schema "
+                                     f"was fixed; declare its type in column_types")
+        self._writer.write_table(pa.Table.from_pandas(df, schema=self._schema, preserve_index=False))
+        self.rows += len(df)
+
+    def close(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._writer is not None:
+            self._writer.close()
+        elif self._empty is not None:
+            self._open(self._empty)
+            self._writer.write_table(pa.Table.from_pandas(self._empty, schema=self._schema, preserve_index=False))
+            self._writer.close()
+        else:
+            # Never saw a frame: a valid, row-less file with the declared columns
+            schema = pa.schema([(name, pa.type_for_alias(alias)) for name, alias in self.column_types.items()])
+            pq.write_table(schema.empty_table(), self.paths[0])
+
+
+class ExcelOutput(_Output):
+
+    def __init__(self, stem, max_rows=EXCEL_MAX_ROWS, sheets_per_file=None):
+        super().__init__(stem)
+        self.max_rows = max_rows
+        self.sheets_per_file = sheets_per_file
+        self._workbook = None
+        self._sheet = None
+        self._sheet_rows = 0
+        self._sheets_in_file = 0
+        self._header = None
+
+    def _new_file(self):
+        from openpyxl import Workbook
+
+        self._save()
+        self._workbook = Workbook(write_only=True)
+        self._sheets_in_file = 0
+        n = len(self.paths) + 1
+        self.paths.append(f"{self.stem}.xlsx" if n == 1 else f"{self.stem}_{n}.xlsx")
+
+    def _new_sheet(self):
+        if self._workbook is None or self._sheets_in_file == self.sheets_per_file:
+            self._new_file()
+        self._sheets_in_file += 1
+        self._sheet = self._workbook.create_sheet(f"Sheet{self._sheets_in_file}")
+        self._sheet.append(self._header)
+        self._sheet_rows = 1
+
+    def write(self, df):
+        if self._header is None:
+            self._header = [str(col) for col in df.columns]
+            self._new_sheet()
+        for start in range(0, len(df), EXCEL_SLICE_ROWS):
+            part = df.iloc[start:start + EXCEL_SLICE_ROWS]
+            values = part.astype(object).where(part.notna(), None)
+            for row in values.itertuples(index=False, name=None):
+                if self._sheet_rows == self.max_rows:
+                    self._new_sheet()
+                self._sheet.append(row)
+                self._sheet_rows += 1
+        self.rows += len(df)
+
+    def _save(self):
+        if self._workbook is not None:
+            self._workbook.save(self.paths[-1])
+            self._workbook = None
+
+    def close(self):
+        if self._header is None:
+            # Nothing written: still produce a workbook with one empty sheet
+            self._header = []
+            self._new_sheet()
+        self._save()
+
+
+def open_output(stem, fmt='xlsx', column_types=None, **kwargs):
+    """Incremental writer for <stem>.<fmt>; use as a context manager.
+
+    column_types only matters for Parquet (see ParquetOutput); kwargs go to
+    the Excel writer.
+    """
+    if fmt == 'csv':
+        return CsvOutput(stem)
+    if fmt == 'parquet':
+        return ParquetOutput(stem, column_types)
+    if fmt == 'xlsx':
+        return ExcelOutput(stem, **kwargs)
+    raise ValueError(f"Unknown output format {fmt!r}, expected one of {OUTPUT_FORMATS}")
+
+
+def write_frame(df, stem, fmt='xlsx', **kwargs):
+    """Write a whole DataFrame through the streaming writer for fmt."""
+    with open_output(stem, fmt, **kwargs) as out:
+        out.write(df)
+    return out.paths
@@ -0,0 +1,24 @@
+import multiprocessing
+
+# ---------- Process Pool Context ---------- #
+# Every process pool here (sharded matching, the lookup service, the
+# partitioned due / collected table) hands its big read-only input to the
+# workers through the pool initializer. With the fork start method the
+# workers inherit it from the parent instead of unpickling a copy each, so
+# fork is used wherever the platform has it.
+# Under spawn (Windows) every worker re-imports the calling script as a
+# module, so pools started from unguarded script-level code (final_report.py,
+# the auditor) would re-run the script in each worker; their pools check
+# can_fork() and run serially instead.
+
+
+def can_fork():
+    """True where the platform has the fork start method."""
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def pool_context():
+    """multiprocessing context for ProcessPoolExecutor(mp_context=...): fork where available."""
+    if can_fork():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
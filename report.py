@@ -1,25 +1,13 @@
 import pandas as pd
+from report_stream import stream_matching_report
+from source_loader import load_source
 
-# Load data (update file paths if needed)
-allocation_df = pd.read_csv('allocation_data.csv')
-due_df = pd.read_csv('due_data.csv')
-
-# Rename columns for consistency to enable merge
-allocation_df.rename(columns={
-    'Loan Account #': 'LOANACCTNO',
-    'Advice Ref #': 'Advice Ref#'
-}, inplace=True)
-
-# Merge due_df with allocation_df on LOANACCTNO and Advice Ref# to align records side by side
-# Use outer join if you want to see all records including unmatched ones
-# For strict match in due_df, use left join
-merged_df = pd.merge(
-    due_df,
-    allocation_df,
-    how='left',  # change to 'outer' to get unmatched on both sides
-    on=['LOANACCTNO', 'Advice Ref#'],
-    suffixes=('_due', '_allocation')
-)
+# 'memory': load both files and merge in pandas; 'stream': index the smaller file and stream
+# the larger one through it chunk by chunk (for inputs larger than RAM, see report_stream.py)
+JOIN_MODE = 'memory'
+# 'left' keeps every due row; 'outer' also keeps unmatched allocations ('stream' mode
+# additionally writes the unmatched rows of both sides to consolidated_unmatched_report.csv)
+HOW = 'left'
 
 # Select and reorder columns to present a clear matching scenario to the manager
 columns_due = [
@@ -33,21 +21,41 @@ columns_allocation = [
     'PRINCOM-P_COLLECTED', 'INTCOMP_COLLECTED', 'Charge Code_allocation', 'CHARGE_COLDESC'
 ]
 
-# Check if all these columns exist in merged_df, some assignment to empty string if missing to avoid errors
-for col in columns_due:
-    if col not in merged_df.columns:
-        merged_df[col] = None
-for col in columns_allocation:
-    if col not in merged_df.columns:
-        merged_df[col] = None
-
-final_columns = columns_due + columns_allocation
-
-report_df = merged_df[final_columns]
-
-# Save the consolidated matching report to CSV
-report_df.to_csv('consolidated_matching_report.csv', index=False)
-
-print("Consolidated matching report generated: consolidated_matching_report.csv")
-print(report_df.head())
+if JOIN_MODE == 'stream':
+    stream_matching_report('due_data.csv', 'allocation_data.csv', columns_due, columns_allocation, how=HOW)
+    print("Consolidated matching report generated: consolidated_matching_report.csv")
+else:
+    # Load data (update file paths if needed); the 'allocation' / 'due' schemas in source_loader.py
+    # rename 'Loan Account #' / 'Advice Ref #' for the merge and read only the report's columns
+    allocation_df = load_source('allocation_data.csv', 'allocation')
+    due_df = load_source('due_data.csv', 'due')
+
+    # Merge due_df with allocation_df on LOANACCTNO and Advice Ref# to align records side by side
+    # Use outer join if you want to see all records including unmatched ones
+    # For strict match in due_df, use left join
+    merged_df = pd.merge(
+        due_df,
+        allocation_df,
+        how=HOW,  # 'outer' to get unmatched on both sides
+        on=['LOANACCTNO', 'Advice Ref#'],
+        suffixes=('_due', '_allocation')
+    )
+
+    # Check if all these columns exist in merged_df, some assignment to empty string if missing to avoid errors
+    for col in columns_due:
+        if col not in merged_df.columns:
+            merged_df[col] = None
+    for col in columns_allocation:
+        if col not in merged_df.columns:
+            merged_df[col] = None
+
+    final_columns = columns_due + columns_allocation
+
+    report_df = merged_df[final_columns]
+
+    # Save the consolidated matching report to CSV
+    report_df.to_csv('consolidated_matching_report.csv', index=False)
+
+    print("Consolidated matching report generated: consolidated_matching_report.csv")
+    print(report_df.head())
 
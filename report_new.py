@@ -1,143 +1,100 @@
-import pandas as pd
-import re
-from datetime import datetime
-from rapidfuzz import fuzz
-import unidecode
+import argparse
+from dob_parser import REPORT_DOB_FORMATS, days_to_dates, format_stats, parse_dob
+from name_normalize import add_canonical_names
+import os
+from dup_cluster import write_cluster_report
+from dup_engine import duplicate_reports, valid_pans
+from dup_incremental import STATE_DIR, incremental_cluster_records, incremental_multi_ucic_pans, record_keys
+from run_stats import RunStats
+from source_loader import load_source
+
+parser = argparse.ArgumentParser(description="Duplicate UCIC reports")
+parser.add_argument("--cluster-output", choices=["consolidated", "per-cluster"], default="consolidated",
+                    help="one file per report (default) or the legacy one CSV per cluster")
+parser.add_argument("--format", choices=["parquet", "csv"], default="parquet",
+                    help="file format of the consolidated cluster reports")
+parser.add_argument("--partitioned", action="store_true",
+                    help="write consolidated reports as partitioned Parquet datasets")
+parser.add_argument("--incremental", action="store_true",
+                    help="only rescore what changed since the last --incremental run")
+parser.add_argument("--state-dir", default=STATE_DIR,
+                    help="where --incremental keeps its cluster/PAN state")
+parser.add_argument("--summary", help="also write a JSON run summary (stage timings, DOB blocks) here")
+args = parser.parse_args()
 
 # ------------------ Load and Normalize ------------------ #
-df = pd.read_csv("customer_data.csv")
+# One RunStats times every stage of all three reports
+stats = RunStats('duplicate_reports')
 
-# Normalize PAN
-df['pan'] = df['pan'].astype(str).str.strip().str.upper()
+# Typed read (all text) through source_loader, cached as Parquet for repeat runs
+df = load_source("customer_data.csv", "customer", stats=stats)
 
-# Normalize DOB with multiple format support
-def normalize_dob(dob_str):
-    if pd.isna(dob_str):
-        return None
-    formats = ["%d-%m-%Y", "%d/%m/%Y", "%m/%d/%Y", "%Y-%m-%d"]
-    for fmt in formats:
-        try:
-            return datetime.strptime(dob_str.strip(), fmt).date()
-        except:
-            continue
-    return None
+# Record identity for --incremental, taken from the raw row content
+keys = record_keys(df) if args.incremental else None
 
-df['dob'] = df['dob'].astype(str).apply(normalize_dob)
+with stats.stage("normalize", rows=len(df)):
+    # Normalize PAN
+    df['pan'] = df['pan'].astype(str).str.strip().str.upper()
 
-# ------------------ PAN Validation ------------------ #
-def is_valid_pan(pan):
-    """
-    Validates a PAN based on structure and excludes test/dummy PANs like 'AAAAA...'
-    """
-    if not isinstance(pan, str):
-        return False
-    pan = pan.strip().upper()
-    # PAN must follow structural format and cannot start with 'AAAAA'
-    if re.fullmatch(r'^[A-Z]{3}[PCHABGJLFT][A-Z][0-9]{4}[A-Z]$', pan):
-        return not pan.startswith('AAAAA')
-    return False
-
-
-# ------------------ Normalize Name and Org ------------------ #
-def normalize_name(name):
-    if pd.isna(name):
-        return ''
-    name = unidecode.unidecode(name.lower())
-    name = re.sub(r'[^a-z\s]', '', name)
-    name = re.sub(r'\s+', ' ', name).strip()
-    return name
-
-df['first_name_norm'] = df['first_name'].apply(normalize_name)
-df['last_name_norm'] = df['last_name'].apply(normalize_name)
-df['organization_name_norm'] = df['organization_name'].apply(normalize_name)
-
-# Combine for full name
-df['full_name'] = (df['first_name_norm'] + ' ' + df['last_name_norm']).str.strip()
-
-# ------------------ REPORT 1: Valid PAN with Multiple UCICs ------------------ #
-valid_pan_df = df[df['pan_valid']]
-
-# Find PANs assigned to multiple UCICs
-multi_ucic_by_pan = (
-    valid_pan_df.groupby('pan')
-    .filter(lambda x: x['ucic'].nunique() > 1)
-    .sort_values(['pan', 'ucic'])
-)
-
-multi_ucic_by_pan.to_csv("01_valid_pan_multiple_ucic.csv", index=False)
-
-# ------------------ REPORT 2: Similar Name + DOB, Different UCIC ------------------ #
-invalid_pan_df = df[~df['pan_valid']]
-
-name_dob_candidates = invalid_pan_df[
-    invalid_pan_df['full_name'].notnull() & invalid_pan_df['dob'].notnull()
-].copy()
-
-# Create a similarity cluster
-def cluster_similar_names(df, threshold=85):
-    clusters = []
-    used = set()
+    # Normalize DOB: dob_day (Int32 day number) is the clustering key
+    df['dob_day'], dob_stats = parse_dob(df['dob'], REPORT_DOB_FORMATS)
+    df['dob'] = days_to_dates(df['dob_day'])
 
-    for i, row_i in df.iterrows():
-        if i in used:
-            continue
-        group = [i]
-        name_i, dob_i = row_i['full_name'], row_i['dob']
+    # Shared canonical names (first/last/org *_norm + full_name), computed on
+    # distinct values only
+    df = add_canonical_names(df)
+print(format_stats(dob_stats))
 
-        for j, row_j in df.loc[df.index > i].iterrows():
-            if j in used:
-                continue
-            name_j, dob_j = row_j['full_name'], row_j['dob']
-
-            if dob_i == dob_j and fuzz.token_sort_ratio(name_i, name_j) >= threshold:
-                group.append(j)
-                used.add(j)
-        if len(group) > 1:
-            clusters.append(df.loc[group])
-            used.update(group)
-    return clusters
-
-name_dob_clusters = cluster_similar_names(name_dob_candidates)
-
-# Save to CSV
-for i, group in enumerate(name_dob_clusters, 1):
-    group.to_csv(f"02_similar_name_dob_diff_ucic_cluster_{i}.csv", index=False)
-
-# ------------------ REPORT 3: Similar Org Name + DOB, Different UCIC ------------------ #
-org_dob_candidates = invalid_pan_df[
-    invalid_pan_df['organization_name_norm'].notnull() & invalid_pan_df['dob'].notnull()
-].copy()
-
-def cluster_similar_orgs(df, threshold=85):
-    clusters = []
-    used = set()
-
-    for i, row_i in df.iterrows():
-        if i in used:
-            continue
-        group = [i]
-        name_i, dob_i = row_i['organization_name_norm'], row_i['dob']
-
-        for j, row_j in df.loc[df.index > i].iterrows():
-            if j in used:
-                continue
-            name_j, dob_j = row_j['organization_name_norm'], row_j['dob']
-
-            if dob_i == dob_j and fuzz.token_sort_ratio(name_i, name_j) >= threshold:
-                group.append(j)
-                used.add(j)
-        if len(group) > 1:
-            clusters.append(df.loc[group])
-            used.update(group)
-    return clusters
-
-org_dob_clusters = cluster_similar_orgs(org_dob_candidates)
-
-for i, group in enumerate(org_dob_clusters, 1):
-    group.to_csv(f"03_similar_org_dob_diff_ucic_cluster_{i}.csv", index=False)
+# ------------------ PAN Validation ------------------ #
+# Structural PAN check (dummy 'AAAAA...' PANs excluded), vectorized in dup_engine
+with stats.stage("PAN validation", rows=len(df)):
+    df['pan_valid'] = valid_pans(df['pan'])
+
+# ------------------ Reports 1-3 ------------------ #
+# 1: valid PANs with multiple UCICs; 2 / 3: similar name / org name + DOB
+# among invalid PANs, clustered within DOB blocks (see dup_engine)
+if args.incremental:
+    valid_pan_df = df[df['pan_valid']]
+    invalid_pan_df = df[~df['pan_valid']]
+
+    def cluster_incremental(name_col, state_file, threshold=85):
+        candidates = invalid_pan_df[(invalid_pan_df[name_col] != '') & invalid_pan_df['dob_day'].notna()]
+        return incremental_cluster_records(candidates, keys[candidates.index], name_col,
+                                           os.path.join(args.state_dir, state_file), threshold)
+
+    with stats.stage("multi-UCIC PANs", rows=len(valid_pan_df)):
+        multi_ucic_by_pan = incremental_multi_ucic_pans(
+            valid_pan_df, keys[valid_pan_df.index], os.path.join(args.state_dir, "pan_ucic.parquet"))
+    with stats.stage("cluster names + orgs", rows=len(invalid_pan_df)):
+        name_dob_clusters = cluster_incremental('full_name', "name_clusters.parquet")
+        org_dob_clusters = cluster_incremental('organization_name_norm', "org_clusters.parquet")
+else:
+    multi_ucic_by_pan, name_dob_clusters, org_dob_clusters = duplicate_reports(df, stats=stats)
+
+# Save clusters: one consolidated file, or one CSV per cluster
+def save_clusters(clusters, stem):
+    # dob_day is only the blocking key; reports keep the readable dob
+    clusters = clusters.drop(columns='dob_day')
+    if args.cluster_output == "consolidated":
+        write_cluster_report(clusters, stem, args.format, args.partitioned)
+        return
+    for i, group in clusters.groupby('cluster_id'):
+        group.to_csv(f"{stem}_cluster_{i}.csv", index=False)
+
+with stats.stage("write reports", rows=len(multi_ucic_by_pan) + len(name_dob_clusters) + len(org_dob_clusters)):
+    multi_ucic_by_pan.drop(columns='dob_day').to_csv("01_valid_pan_multiple_ucic.csv", index=False)
+    save_clusters(name_dob_clusters, "02_similar_name_dob_diff_ucic")
+    save_clusters(org_dob_clusters, "03_similar_org_dob_diff_ucic")
 
 # ------------------ Summary ------------------ #
 print("✅ Reports generated:")
 print("1. 01_valid_pan_multiple_ucic.csv")
-print("2. 02_similar_name_dob_diff_ucic_cluster_X.csv")
-print("3. 03_similar_org_dob_diff_ucic_cluster_X.csv")
+if args.cluster_output == "consolidated":
+    ext = "" if args.partitioned else f".{args.format}"
+    print(f"2. 02_similar_name_dob_diff_ucic{ext} (+ _summary.csv)")
+    print(f"3. 03_similar_org_dob_diff_ucic{ext} (+ _summary.csv)")
+else:
+    print("2. 02_similar_name_dob_diff_ucic_cluster_X.csv")
+    print("3. 03_similar_org_dob_diff_ucic_cluster_X.csv")
+if args.summary:
+    stats.write_summary(args.summary)
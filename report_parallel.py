@@ -0,0 +1,124 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from process_pools import can_fork, pool_context
+
+# ---------- Partitioned Due / Collected Table ---------- #
+# The monthly report scripts prepare the ledger (LAN_code from a sorted
+# factorize of LOANACCTNO, Advice_Month / Allocation_Month periods, amounts)
+# and hand it to due_collected_table. Every (LOANACCTNO, month) row of the
+# result, and the Advice Ref# dedup behind it, depends only on that
+# account's ledger rows. So with workers > 1 the rows are split by
+# LAN_code % parts, each worker builds its partition's table with the same
+# serial code, and the sorted partition tables are merged pairwise on the
+# (month, LAN_code) key instead of being re-sorted. The frame reaches the
+# workers through the pool initializer (inherited with fork, see
+# process_pools); tasks only carry row positions.
+
+# Partitions per worker, so one account-heavy partition does not leave the rest idle
+PARTS_PER_WORKER = 4
+DUE_CHARGE_CODE = 9
+
+_frame = None
+
+
+def _init_worker(frame):
+    global _frame
+    _frame = frame
+
+
+def _partition_table(positions, dedup_advices):
+    return _table(_frame.iloc[positions], dedup_advices)
+
+
+def _exact(sums):
+    # int64 fixed-point sums (money.py) go through the outer combine as
+    # nullable Int64 instead of float64; float amounts (auditor) stay float
+    return sums.astype('Int64') if pd.api.types.is_integer_dtype(sums) else sums
+
+
+def _table(df, dedup_advices):
+    dues = df[df['Charge_Code_due'] == DUE_CHARGE_CODE]
+    if dedup_advices:
+        dues = dues.drop_duplicates(subset=['LOANACCTNO', 'Advice Ref#'])  # One due per advice
+    due = (
+        dues.groupby(['LAN_code', 'Advice_Month'])['DueAmount'].sum()
+        .rename_axis(['LAN_code', 'Month'])
+    )
+    collected = (
+        df.groupby(['LAN_code', 'Allocation_Month'])['Collected Amount'].sum()
+        .rename_axis(['LAN_code', 'Month'])
+    )
+    # One aligned outer combine; pairs without dues / collections get 0
+    table = pd.concat([_exact(due), _exact(collected)], axis=1).fillna(0)
+    return table.sort_index(level=['Month', 'LAN_code']).reset_index()
+
+
+def sort_keys(table, n_codes):
+    """int64 key per table row ordering it by month, then LAN_code."""
+    months = pd.PeriodIndex(table['Month']).asi8
+    return months * n_codes + table['LAN_code'].to_numpy(dtype=np.int64)
+
+
+def merge_sorted(runs):
+    """Row order over the concatenated runs (each sorted by its keys) that
+    merges them; runs are merged two at a time, so log2(len(runs)) linear
+    passes instead of a sort of everything."""
+    offsets = np.cumsum([0] + [len(keys) for keys in runs])
+    runs = [(keys, np.arange(start, start + len(keys))) for keys, start in zip(runs, offsets)]
+    while len(runs) > 1:
+        merged = []
+        for (a_keys, a_rows), (b_keys, b_rows) in zip(runs[0::2], runs[1::2]):
+            # b's slots in the merged run; equal keys keep a's rows first
+            b_slots = np.searchsorted(a_keys, b_keys, side='right') + np.arange(len(b_keys))
+            from_b = np.zeros(len(a_keys) + len(b_keys), dtype=bool)
+            from_b[b_slots] = True
+            keys = np.empty(len(from_b), dtype=np.int64)
+            rows = np.empty(len(from_b), dtype=np.int64)
+            keys[from_b], keys[~from_b] = b_keys, a_keys
+            rows[from_b], rows[~from_b] = b_rows, a_rows
+            merged.append((keys, rows))
+        if len(runs) % 2:
+            merged.append(runs[-1])
+        runs = merged
+    return runs[0][1] if runs else np.empty(0, dtype=np.int64)
+
+
+def account_partitions(codes, n_parts):
+    """Row positions per partition of the LAN codes (rows without one are dropped)."""
+    part_ids = np.where(codes >= 0, codes % n_parts, -1)
+    parts = [np.flatnonzero(part_ids == i) for i in range(n_parts)]
+    return [positions for positions in parts if len(positions)]
+
+
+def due_collected_table(df, workers=1, dedup_advices=True):
+    """Dues (Charge_Code_due == 9) and collections per (LAN_code, Month),
+    sorted by month then LAN_code, with 0 where a side is missing.
+
+    dedup_advices counts one due per (LOANACCTNO, Advice Ref#) (final_report)
+    instead of every due row (auditor). workers > 1 gives the same rows in
+    the same order, computed per LOANACCTNO partition in a process pool.
+    The pool needs fork: its callers are unguarded scripts, which spawned
+    workers would re-run, so without fork the table is computed serially.
+    """
+    if workers > 1 and not can_fork():
+        print(f"⚠️  No fork start method on this platform; computing the table serially, not with {workers} workers")
+        workers = 1
+    if workers <= 1:
+        return _table(df, dedup_advices)
+
+    codes = df['LAN_code'].to_numpy()
+    parts = account_partitions(codes, workers * PARTS_PER_WORKER)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context(),
+                             initializer=_init_worker, initargs=(df,)) as pool:
+        futures = [pool.submit(_partition_table, positions, dedup_advices) for positions in parts]
+        tables = [future.result() for future in futures]
+
+    tables = [table for table in tables if len(table)]
+    if not tables:
+        return _table(df.iloc[:0], dedup_advices)
+    n_codes = int(codes.max()) + 1
+    order = merge_sorted([sort_keys(table, n_codes) for table in tables])
+    return pd.concat(tables, ignore_index=True).iloc[order].reset_index(drop=True)
@@ -0,0 +1,198 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from output_writers import open_output
+from run_stats import RunStats
+from source_loader import SCHEMAS
+
+# ---------- Indexed Streaming Join ---------- #
+# report.py's due / allocation matching join for files larger than RAM.
+# Only the columns the report shows are read, with the dtypes and aliases
+# of the 'due' / 'allocation' source schemas (text keys and ids, float
+# amounts, categorical codes / descriptions). The
+# smaller file (by size on disk) is loaded once and indexed on the join key:
+# 64-bit key hashes sorted once, so the rows of a key are one searchsorted
+# range, with the key text compared afterwards so a hash collision can
+# never pair wrong rows. The larger file is streamed through that index
+# chunk by chunk and every joined chunk is written out straight away.
+# Rows of the indexed file that found a match are flagged as the stream
+# goes by, so its unmatched rows are known at the end without a second pass.
+#
+# Rows come out in streamed-file order: with the due file streamed that is
+# exactly pd.merge(how='left')'s order; with the allocation file streamed,
+# dues without any allocation follow at the end. how='outer' adds the rows
+# of either side without a partner (not key-sorted as pd.merge's outer is)
+# and also writes them, tagged with their side, to an unmatched report.
+
+JOIN_CHUNK_ROWS = 250_000
+JOIN_KEYS = ['LOANACCTNO', 'Advice Ref#']
+SUFFIXES = ('_due', '_allocation')
+
+
+class JoinSide:
+    """One input file: which source columns to read, and the report column each becomes."""
+
+    def __init__(self, path, schema, suffix, other_columns, report_columns):
+        self.path = path
+        header = pd.read_csv(path, nrows=0).columns
+        self.rename = {col: schema.aliases.get(col, col) for col in header}
+        overlap = set(other_columns) - set(JOIN_KEYS)
+        # pd.merge's suffixes: overlapping non-key columns get the side's suffix
+        self.output = {col: (name + suffix if name in overlap else name) for col, name in self.rename.items()}
+        self.usecols = [col for col in header
+                        if self.rename[col] in JOIN_KEYS or self.output[col] in report_columns]
+        self.dtypes = {col: str if self.rename[col] in JOIN_KEYS else schema.dtype(self.rename[col])
+                       for col in self.usecols}
+
+    def read(self, chunksize=None):
+        frames = pd.read_csv(self.path, usecols=self.usecols, dtype=self.dtypes, chunksize=chunksize)
+        if chunksize is None:
+            return self._prepare(frames)
+        return (self._prepare(chunk) for chunk in frames)
+
+    def _prepare(self, frame):
+        frame = frame.rename(columns=self.rename)
+        # Keys compared as text, missing keys as one value (as pd.merge matches NaN to NaN)
+        for key in JOIN_KEYS:
+            frame[key] = frame[key].fillna('\0')
+        return frame.reset_index(drop=True)
+
+    def to_report(self, frame):
+        """frame's columns under their report names."""
+        columns = {self.rename[col]: self.output[col] for col in self.usecols}
+        return frame[list(columns)].rename(columns=columns)
+
+    def no_rows(self):
+        """Empty report frame of this side (the partner of unmatched rows)."""
+        return pd.DataFrame(columns=[self.output[col] for col in self.usecols])
+
+
+def key_hashes(frame):
+    return pd.util.hash_pandas_object(frame[JOIN_KEYS], index=False).to_numpy()
+
+
+class KeyIndex:
+    """Row positions of a frame per join key, plus which rows found a partner."""
+
+    def __init__(self, frame):
+        self.frame = frame
+        hashes = key_hashes(frame)
+        self.order = np.argsort(hashes, kind='stable')
+        self.hashes = hashes[self.order]
+        self.matched = np.zeros(len(frame), dtype=bool)
+
+    def lookup(self, probe):
+        """(probe rows, indexed rows) of all key matches, ordered by probe
+        row, then indexed row."""
+        hashes = key_hashes(probe)
+        lo = np.searchsorted(self.hashes, hashes, side='left')
+        counts = np.searchsorted(self.hashes, hashes, side='right') - lo
+        probe_rows = np.repeat(np.arange(len(probe)), counts)
+        within = np.arange(len(probe_rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = self.order[np.repeat(lo, counts) + within]
+        same = np.ones(len(rows), dtype=bool)
+        for key in JOIN_KEYS:
+            same &= probe[key].to_numpy(dtype=object)[probe_rows] == self.frame[key].to_numpy(dtype=object)[rows]
+        probe_rows, rows = probe_rows[same], rows[same]
+        self.matched[rows] = True
+        return probe_rows, rows
+
+
+def _take(frame, rows):
+    """frame's rows at positions rows; all missing where rows is -1."""
+    if len(frame) == 0:
+        return pd.DataFrame(np.nan, index=range(len(rows)), columns=frame.columns)
+    part = frame.iloc[np.maximum(rows, 0)].reset_index(drop=True)
+    if (rows < 0).any():
+        part.loc[rows < 0, :] = np.nan
+    return part
+
+
+def _joined(due, due_rows, allocation, allocation_rows, columns):
+    """Report rows pairing due_rows with allocation_rows (-1: no partner on that side)."""
+    due_part = _take(due, due_rows)
+    allocation_part = _take(allocation, allocation_rows)
+    # Keys come from the due row, or from the allocation row when there is none (as in pd.merge)
+    for key in JOIN_KEYS:
+        due_part[key] = due_part[key].where(due_rows >= 0, allocation_part[key]).replace('\0', None)
+    return pd.concat([due_part, allocation_part.drop(columns=JOIN_KEYS)], axis=1).reindex(columns=columns)
+
+
+def stream_matching_report(due_path, allocation_path, columns_due, columns_allocation,
+                           output_stem='consolidated_matching_report', how='left',
+                           unmatched_stem='consolidated_unmatched_report', chunksize=JOIN_CHUNK_ROWS, stats=None):
+    """report.py's consolidated matching report via an indexed streaming
+    join (how: 'left' on the due file, or 'outer'). Returns the row counts."""
+    if how not in ('left', 'outer'):
+        raise ValueError(f"Unknown join {how!r}, expected 'left' or 'outer'")
+    if stats is None:
+        stats = RunStats('matching_report')
+    columns = columns_due + columns_allocation
+    due_schema, allocation_schema = SCHEMAS['due'], SCHEMAS['allocation']
+    due_header = [due_schema.aliases.get(col, col) for col in pd.read_csv(due_path, nrows=0).columns]
+    allocation_header = [allocation_schema.aliases.get(col, col)
+                         for col in pd.read_csv(allocation_path, nrows=0).columns]
+    due_side = JoinSide(due_path, due_schema, SUFFIXES[0], allocation_header, columns)
+    allocation_side = JoinSide(allocation_path, allocation_schema, SUFFIXES[1], due_header, columns)
+
+    stream_due = os.path.getsize(due_path) >= os.path.getsize(allocation_path)
+    indexed_side, streamed_side = (allocation_side, due_side) if stream_due else (due_side, allocation_side)
+    with stats.stage(f"index {os.path.basename(indexed_side.path)}"):
+        index = KeyIndex(indexed_side.read())
+    print(f"🔑 Indexed {len(index.frame)} rows of {indexed_side.path}; streaming {streamed_side.path}")
+
+    indexed = indexed_side.to_report(index.frame)
+    counts = {'rows': 0, 'unmatched_due': 0, 'unmatched_allocation': 0}
+    with open_output(output_stem, 'csv') as out, open_output(unmatched_stem, 'csv') as unmatched_out:
+
+        def emit(report, unmatched_side=None):
+            out.write(report)
+            counts['rows'] += len(report)
+            if unmatched_side is not None:
+                counts['unmatched_' + unmatched_side] += len(report)
+                if how == 'outer':
+                    unmatched_out.write(report.assign(**{'Unmatched Side': unmatched_side}))
+
+        for chunk in streamed_side.read(chunksize):
+            with stats.stage("join", rows=len(chunk), quiet=True):
+                probe_rows, rows = index.lookup(chunk)
+                streamed = streamed_side.to_report(chunk)
+                lonely = np.setdiff1d(np.arange(len(chunk)), probe_rows)
+                none = np.full(len(lonely), -1)
+                if stream_due:
+                    # Left join in due order: dues without allocations stay in place
+                    due_rows = np.concatenate([probe_rows, lonely])
+                    order = np.argsort(due_rows, kind='stable')
+                    allocation_rows = np.concatenate([rows, none])[order]
+                    emit(_joined(streamed, due_rows[order], indexed, allocation_rows, columns))
+                    counts['unmatched_due'] += len(lonely)
+                    if how == 'outer' and len(lonely):
+                        unmatched_out.write(_joined(streamed, lonely, allocation_side.no_rows(), none, columns)
+                                            .assign(**{'Unmatched Side': 'due'}))
+                else:
+                    emit(_joined(indexed, rows, streamed, probe_rows, columns))
+                    if how == 'outer':
+                        emit(_joined(due_side.no_rows(), none, streamed, lonely, columns), 'allocation')
+                    else:
+                        counts['unmatched_allocation'] += len(lonely)
+            stats.progress(counts['rows'])
+
+        # Rows of the indexed file that no streamed row matched
+        lonely = np.flatnonzero(~index.matched)
+        none = np.full(len(lonely), -1)
+        with stats.stage("unmatched rows", rows=len(lonely)):
+            if not stream_due:
+                emit(_joined(indexed, lonely, allocation_side.no_rows(), none, columns), 'due')
+            elif how == 'outer':
+                emit(_joined(due_side.no_rows(), none, indexed, lonely, columns), 'allocation')
+            else:
+                counts['unmatched_allocation'] += len(lonely)
+
+    print(f"🔗 {counts['rows']} report rows; unmatched: {counts['unmatched_due']} dues, "
+          f"{counts['unmatched_allocation']} allocations")
+    if how == 'outer':
+        print(f"📄 Unmatched rows written to {unmatched_stem}.csv")
+    stats.counts.update(counts)
+    return counts
@@ -0,0 +1,182 @@
+import cProfile
+import datetime
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# ---------- Run Instrumentation ---------- #
+# One RunStats per run collects:
+#   - wall and CPU time per stage (load, clean, index build, match, export;
+#     CPU includes reaped worker processes),
+#   - matches per rule (PAN, Aadhar+DOB, fuzzy person, fuzzy org),
+#   - a histogram of fuzzy candidate block sizes plus the slowest blocks,
+#     so a giant placeholder-DOB block (1900-01-01 ...) shows up by name,
+#   - throttled rows/sec + ETA progress lines,
+#   - tallies of per-chunk diagnostics (DOB parse counts, ...), summed so
+#     the owner of the run can print them once,
+# and writes them as a JSON run summary. profile() wraps the hot call in
+# cProfile when asked to.
+
+PROGRESS_EVERY_S = 5.0
+SLOWEST_BLOCKS = 10
+
+
+def _cpu_seconds():
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (2**20 if sys.platform == 'darwin' else 2**10)
+
+
+def size_bucket(size):
+    """Power-of-two histogram bucket label: "1", "2-3", "4-7", ..."""
+    if size < 2:
+        return str(size)
+    low = 1 << (size.bit_length() - 1)
+    return f"{low}-{2 * low - 1}"
+
+
+def _dob_label(dob):
+    try:
+        return str(datetime.date(1970, 1, 1) + datetime.timedelta(days=int(dob)))
+    except (TypeError, ValueError, OverflowError):
+        return str(dob)
+
+
+class RunStats:
+
+    def __init__(self, name, show_progress=True):
+        self.name = name
+        self.show_progress = show_progress
+        self.started = datetime.datetime.now().isoformat(timespec='seconds')
+        self.stages = []
+        self.rule_hits = Counter()
+        self.block_sizes = Counter()
+        self.slowest_blocks = []
+        self.counts = {}
+        self.tallies = {}
+        self._start = time.perf_counter()
+        self._start_cpu = _cpu_seconds()
+        self._progress_start = None
+        self._progress_last = 0.0
+
+    @contextmanager
+    def stage(self, name, rows=None, quiet=False):
+        """Time the enclosed block as stage name (rows for rows/sec).
+
+        Repeated stages of the same name (e.g. once per streamed chunk) add
+        up into one entry.
+        """
+        wall, cpu = time.perf_counter(), _cpu_seconds()
+        try:
+            yield self
+        finally:
+            entry = self.add_time(name, time.perf_counter() - wall, _cpu_seconds() - cpu, rows)
+            if not quiet:
+                print(f"⏱️  {name}: {entry['wall_s']:.2f}s wall, {entry['cpu_s']:.2f}s CPU")
+
+    def add_time(self, name, wall, cpu, rows=None):
+        entry = next((entry for entry in self.stages if entry['stage'] == name), None)
+        if entry is None:
+            entry = {'stage': name, 'wall_s': 0.0, 'cpu_s': 0.0}
+            self.stages.append(entry)
+        entry['wall_s'] = round(entry['wall_s'] + wall, 3)
+        entry['cpu_s'] = round(entry['cpu_s'] + cpu, 3)
+        if rows is not None:
+            entry['rows'] = entry.get('rows', 0) + rows
+            entry['rows_per_s'] = round(entry['rows'] / entry['wall_s'], 1) if entry['wall_s'] else None
+        return entry
+
+    def record_block(self, kind, dob, candidates, queries, seconds):
+        """One fuzzy-scored DOB block: histogram it, keep it if among the slowest."""
+        self.block_sizes[size_bucket(candidates)] += 1
+        self.slowest_blocks.append({'kind': kind, 'dob': _dob_label(dob), 'candidates': candidates,
+                                    'queries': queries, 'seconds': round(seconds, 4)})
+        if len(self.slowest_blocks) > 4 * SLOWEST_BLOCKS:
+            self._trim_blocks()
+
+    def tally(self, topic, counts):
+        """Add counts (name -> int) to topic's running totals."""
+        self.tallies.setdefault(topic, Counter()).update(counts)
+
+    def _trim_blocks(self):
+        self.slowest_blocks.sort(key=lambda block: block['seconds'], reverse=True)
+        del self.slowest_blocks[SLOWEST_BLOCKS:]
+
+    def merge(self, other):
+        """Fold rule hits, block stats and tallies of another RunStats (e.g. a worker's) in."""
+        self.rule_hits.update(other.rule_hits)
+        for topic, counts in other.tallies.items():
+            self.tally(topic, counts)
+        self.block_sizes.update(other.block_sizes)
+        self.slowest_blocks.extend(other.slowest_blocks)
+        self._trim_blocks()
+
+    def progress(self, done, total=None, force=False):
+        """Print rows done, rows/sec and ETA at most every PROGRESS_EVERY_S."""
+        if not self.show_progress:
+            return
+        now = time.perf_counter()
+        if self._progress_start is None:
+            # First call starts the clock; the first line comes one interval later
+            self._progress_start = self._progress_last = now
+        if not force and now - self._progress_last < PROGRESS_EVERY_S:
+            return
+        self._progress_last = now
+        elapsed = now - self._progress_start
+        rate = done / elapsed if elapsed else 0.0
+        line = f"Processed {done}" + (f"/{total}" if total else "") + f" rows ({rate:,.0f} rows/s"
+        if total and rate:
+            line += f", ETA {(total - done) / rate:,.0f}s"
+        print(line + ")")
+
+    def summary(self):
+        self._trim_blocks()
+        return {
+            'run': self.name,
+            'started': self.started,
+            'wall_s': round(time.perf_counter() - self._start, 3),
+            'cpu_s': round(_cpu_seconds() - self._start_cpu, 3),
+            'peak_rss_mb': round(_peak_rss_mb(), 1),
+            'stages': self.stages,
+            'counts': self.counts,
+            'rule_hits': dict(self.rule_hits),
+            'tallies': {topic: dict(counts) for topic, counts in self.tallies.items()},
+            'block_sizes': dict(sorted(self.block_sizes.items(), key=lambda item: int(item[0].split('-')[0]))),
+            'slowest_blocks': self.slowest_blocks,
+        }
+
+    def write_summary(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        print(f"📝 Run summary written to {path}")
+
+
+@contextmanager
+def profile(enabled, path, top=25):
+    """cProfile the enclosed block when enabled; dump stats to path and
+    print the top functions by cumulative time."""
+    if not enabled:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(top)
+        print(out.getvalue())
+        print(f"📝 Profile written to {path}")
@@ -0,0 +1,238 @@
+import importlib.util
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from run_stats import RunStats
+from state_files import file_stamp, read_meta, save_stamped
+
+# ---------- Typed Source Loader ---------- #
+# Every input extract is described once in SCHEMAS: the aliases its columns
+# go by ('Loan Account #' -> LOANACCTNO), the dtype of each column, the
+# format of each date column and the columns the reports actually use
+# (None: keep all, for scripts that write whole rows back out). load_source
+# reads only those columns, renames them, applies the dtypes and parses the
+# dates (each distinct value once, errors='coerce').
+# CSVs go through pandas' multithreaded pyarrow engine (the C engine when
+# pyarrow is not installed); the typed frame is then cached as Parquet under
+# SOURCE_CACHE_DIR, keyed on the source's size and mtime plus the schema, so
+# a repeat run over an unchanged extract reads the columnar copy instead of
+# re-parsing the text (or the workbook). A numeric column holding text that
+# does not parse is re-read as text and coerced, with a warning, instead of
+# failing the load.
+
+SOURCE_CACHE_DIR = ".source_cache"
+# Bump whenever the cached frame layout changes
+SOURCE_CACHE_LAYOUT = 1
+
+_NUMERIC_DTYPES = ('float64', 'Int64', 'int64')
+
+
+class SourceSchema:
+    """How one source file is read.
+
+    columns: canonical names the readers need (None: every column);
+    aliases: source name -> canonical name; dtypes: canonical name -> dtype
+    (default_dtype for the rest, None lets the parser infer); dates:
+    canonical name -> strptime format, parsed to datetime64; inferred:
+    columns read as text and then given the type read_csv would infer for
+    them (infer_type), since the pyarrow engine cannot infer a column next to
+    declared ones when it has blanks.
+    """
+
+    def __init__(self, name, columns=None, aliases=None, dtypes=None, dates=None, default_dtype=None,
+                 inferred=()):
+        self.name = name
+        self.columns = columns
+        self.aliases = aliases or {}
+        self.dtypes = dtypes or {}
+        self.dates = dates or {}
+        self.default_dtype = default_dtype
+        self.inferred = list(inferred)
+
+    def dtype(self, col):
+        if col in self.dates or col in self.inferred:
+            return str
+        return self.dtypes.get(col, self.default_dtype)
+
+    def signature(self):
+        """JSON-able description, so the cache notices schema edits."""
+        dtype_name = lambda dtype: getattr(dtype, '__name__', dtype)
+        return {'columns': self.columns, 'aliases': self.aliases, 'dates': self.dates,
+                'dtypes': {col: dtype_name(dtype) for col, dtype in self.dtypes.items()},
+                'default_dtype': dtype_name(self.default_dtype), 'inferred': self.inferred}
+
+
+LOAN_ALIASES = {'Loan Account #': 'LOANACCTNO', 'Advice Ref #': 'Advice Ref#'}
+
+SCHEMAS = {
+    # Ledger behind final_report.py's monthly due vs collected report
+    'ledger': SourceSchema(
+        'ledger',
+        columns=['LOANACCTNO', 'Advice Ref#', 'Advice Date', 'Allocation Date', 'Charge_Code_due',
+                 'DueAmount', 'Collected Amount'],
+        aliases=LOAN_ALIASES,
+        dtypes={'Advice Ref#': str, 'Charge_Code_due': 'float64', 'DueAmount': 'float64',
+                'Collected Amount': 'float64'},
+        dates={'Advice Date': '%d-%m-%y', 'Allocation Date': '%Y-%m-%d'},
+        # Account numbers render as read_csv typed them (floats once one is blank)
+        inferred=['LOANACCTNO'],
+    ),
+    # report.py's two sides; join keys and ids stay text, so both sides compare them the same way
+    'due': SourceSchema(
+        'due',
+        columns=['LOANACCTNO', 'Product Code', 'AGREEMENTID', 'Advice Ref#', 'Advice Date', 'Advice Month',
+                 'DueAmount', 'Principal Due Component', 'Interest Due Component', 'Installment',
+                 'Charge Code', 'CHARGEDESCCHARGEDESC'],
+        aliases=LOAN_ALIASES,
+        dtypes={'DueAmount': 'float64', 'Principal Due Component': 'float64',
+                'Interest Due Component': 'float64', 'Product Code': 'category', 'Advice Month': 'category',
+                'Charge Code': 'category', 'CHARGEDESCCHARGEDESC': 'category'},
+        default_dtype=str,
+    ),
+    'allocation': SourceSchema(
+        'allocation',
+        columns=['LOANACCTNO', 'Advice Ref#', 'Receipt Ref #', 'Allocation Date', 'Allocation Month',
+                 'Collected_Amount', 'PRINCOM-P_COLLECTED', 'INTCOMP_COLLECTED', 'Charge Code', 'CHARGE_COLDESC'],
+        aliases=LOAN_ALIASES,
+        dtypes={'Collected_Amount': 'float64', 'PRINCOM-P_COLLECTED': 'float64', 'INTCOMP_COLLECTED': 'float64',
+                'Allocation Month': 'category', 'Charge Code': 'category', 'CHARGE_COLDESC': 'category'},
+        default_dtype=str,
+    ),
+    # report_new.py's customer extract: whole rows go back out, so every column, as text
+    'customer': SourceSchema('customer', default_dtype=str),
+    # New-customer file of both UCIC matchers: all text, as read_excel(dtype=str) gave
+    'ucic_new': SourceSchema('ucic_new', default_dtype=str),
+}
+
+
+def _pyarrow_engine():
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def _source_columns(path, schema):
+    """Source column -> canonical name, for the columns to read."""
+    if path.lower().endswith(('.xlsx', '.xlsm', '.xls')):
+        header = pd.read_excel(path, nrows=0).columns
+    else:
+        header = pd.read_csv(path, nrows=0).columns
+    renamed = {col: schema.aliases.get(col, col) for col in header}
+    if schema.columns is None:
+        return renamed
+    wanted = {col: name for col, name in renamed.items() if name in schema.columns}
+    missing = [name for name in schema.columns if name not in wanted.values()]
+    if missing:
+        print(f"⚠️  {path}: no column(s) {', '.join(missing)}")
+    return wanted
+
+
+def _read_raw(path, columns, dtypes):
+    usecols = list(columns)
+    if path.lower().endswith(('.xlsx', '.xlsm', '.xls')):
+        return pd.read_excel(path, usecols=usecols, dtype=dtypes)
+    engine = 'pyarrow' if _pyarrow_engine() else 'c'
+    return pd.read_csv(path, usecols=usecols, dtype=dtypes, engine=engine)
+
+
+def parse_dates(values, fmt):
+    """datetime64 per value (NaT where it does not parse), each distinct value parsed once."""
+    codes, uniques = pd.factorize(values)
+    dates = pd.to_datetime(pd.Series(uniques, dtype=object), format=fmt, errors='coerce')
+    # Code -1 (missing value) maps to the appended NaT slot, which also covers an all-missing column
+    dates = np.append(dates.to_numpy(dtype='datetime64[ns]'), np.datetime64('NaT', 'ns'))
+    return pd.Series(dates[codes], index=values.index)
+
+
+def infer_type(values):
+    """Text values as the type read_csv infers for such a column: numbers if
+    every present value parses as one (float64 once any is missing), else
+    the text itself."""
+    numbers = pd.to_numeric(values, errors='coerce')
+    if (numbers.isna() & values.notna()).any():
+        return values
+    return numbers.astype(np.float64) if values.isna().any() else numbers
+
+
+def read_source(path, schema):
+    """The source file at path as a typed frame under schema (no cache)."""
+    columns = _source_columns(path, schema)
+    dtypes = {col: schema.dtype(name) for col, name in columns.items() if schema.dtype(name) is not None}
+    try:
+        df = _read_raw(path, columns, dtypes)
+    except ValueError:
+        # Some numeric column holds text: read those as text and coerce
+        numeric = [col for col, dtype in dtypes.items() if dtype in _NUMERIC_DTYPES]
+        df = _read_raw(path, columns, {col: (str if col in numeric else dtype) for col, dtype in dtypes.items()})
+        for col in numeric:
+            values = pd.to_numeric(df[col], errors='coerce')
+            bad = int((values.isna() & df[col].notna()).sum())
+            if bad:
+                print(f"⚠️  {path}: {bad} values of {col} are not numbers; read as missing")
+            df[col] = values.astype(dtypes[col])
+    df = df.rename(columns=columns)
+    for col in schema.inferred:
+        if col in df.columns:
+            df[col] = infer_type(df[col])
+    for col, fmt in schema.dates.items():
+        if col in df.columns:
+            df[col] = parse_dates(df[col], fmt)
+    return df
+
+
+def _cache_paths(path, schema, cache_dir):
+    stem = os.path.join(cache_dir, f"{os.path.basename(path)}.{schema.name}")
+    return stem + ".parquet", stem + ".meta.json"
+
+
+def _source_meta(path, schema):
+    stamp = file_stamp(path)
+    if stamp is None:
+        raise FileNotFoundError(path)
+    return dict(stamp, path=os.path.abspath(path), schema=schema.signature(),
+                layout=SOURCE_CACHE_LAYOUT)
+
+
+def load_source(path, schema, cache_dir=SOURCE_CACHE_DIR, stats=None):
+    """Typed frame of the source file at path under schema (a SCHEMAS name
+    or a SourceSchema), from the Parquet cache while the file is unchanged."""
+    if stats is None:
+        stats = RunStats('load_source', show_progress=False)
+    schema = SCHEMAS[schema] if isinstance(schema, str) else schema
+    if not _pyarrow_engine():
+        with stats.stage(f"read {os.path.basename(path)}"):
+            return read_source(path, schema)
+
+    paths = _cache_paths(path, schema, cache_dir)
+    meta = _source_meta(path, schema)
+    if read_meta(paths) == meta:
+        print(f"⚡ Using cached {os.path.basename(path)}")
+        with stats.stage(f"load cached {os.path.basename(path)}"):
+            return pd.read_parquet(paths[0])
+
+    with stats.stage(f"read {os.path.basename(path)}"):
+        df = read_source(path, schema)
+    with stats.stage(f"cache {os.path.basename(path)}", rows=len(df)):
+        save_stamped(paths, lambda cache_path: df.to_parquet(cache_path, index=False), meta)
+    return df
+
+
+def _check_blank_account():
+    """Regression check: a ledger with a blank LOANACCTNO loads (it used to
+    fail the pyarrow read) with the account column read_csv gives."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'ledger.csv')
+        pd.DataFrame({'LOANACCTNO': pd.array([101, None, 103], dtype='Int64'), 'Advice Ref#': ['A1', 'A2', 'A3'],
+                      'Advice Date': ['01-04-25'] * 3, 'Allocation Date': ['2025-04-02', '', '2025-04-03'],
+                      'Charge_Code_due': [1, 2, 1], 'DueAmount': [10.5, 20, 30],
+                      'Collected Amount': [10.5, None, 30]}).to_csv(path, index=False)
+        expected = pd.read_csv(path)['LOANACCTNO']
+        for _ in range(2):  # the read, then the cached copy
+            loaded = load_source(path, 'ledger', cache_dir=os.path.join(tmp, 'cache'))['LOANACCTNO']
+            assert loaded.equals(expected), loaded
+    print("✅ ledger with a blank LOANACCTNO loads")
+
+
+if __name__ == "__main__":
+    _check_blank_account()
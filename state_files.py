@@ -0,0 +1,57 @@
+import json
+import os
+import pickle
+
+# ---------- Stamped State Files ---------- #
+# Every on-disk cache / state here (cleaned UCIC master, due/collection
+# aggregates, typed source copies, duplicate-detection state) is a payload
+# file plus a JSON meta file recording what the payload was built from
+# (source size / mtime stamps, layout versions, settings). Readers trust a
+# payload only when its meta is there and matches. save_stamped removes the
+# old meta first and writes the new one last, so a crash mid-write leaves
+# no meta, i.e. no (stale) hit.
+
+
+def file_stamp(path):
+    """Size and mtime of the file at path (None if there is none)."""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def read_meta(paths):
+    """Meta dict of a (payload path, meta path) pair, or None unless both files exist."""
+    payload_path, meta_path = paths
+    if not (os.path.exists(payload_path) and os.path.exists(meta_path)):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def write_meta(paths, meta):
+    with open(paths[1], 'w') as f:
+        json.dump(meta, f)
+
+
+def save_stamped(paths, write_payload, meta):
+    """write_payload(payload path), then the meta (see module comment)."""
+    payload_path, meta_path = paths
+    os.makedirs(os.path.dirname(payload_path) or ".", exist_ok=True)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    write_payload(payload_path)
+    write_meta(paths, meta)
+
+
+def dump_pickle(obj):
+    """write_payload for save_stamped that pickles obj."""
+    def write(path):
+        with open(path, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return write
+
+
+def load_pickle(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
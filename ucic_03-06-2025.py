@@ -1,31 +1,27 @@
+import argparse
 import pandas as pd
 import numpy as np
 import re
 from datetime import datetime
-from rapidfuzz.fuzz import token_sort_ratio
+from output_writers import OUTPUT_FORMATS, write_frame
+from run_stats import RunStats, profile
+from source_loader import load_source
+from ucic_cache import load_master
+from ucic_clean import clean_ucic_frame
+from ucic_index import MasterIndex, first_fuzzy_match, match_batch, split_matches
 
 # ---------- Step 1: Load & Clean Data ---------- #
 
-def load_and_clean_data():
-    df_master = pd.read_csv("UCIC_Dump.csv", dtype=str)
-    df_new = pd.read_excel("ucic_02-62025.xlsx", dtype=str)
+def load_and_clean_data(stats=None):
+    stats = stats or RunStats('load_and_clean_data', show_progress=False)
+    # Compact master store + its index come from the on-disk cache when valid
+    master, index = load_master("UCIC_Dump.csv", stats=stats)
+    # All-text read of the new file, from its Parquet cache while the workbook is unchanged
+    raw = load_source("ucic_02-62025.xlsx", "ucic_new", stats=stats)
+    with stats.stage("clean new file", rows=len(raw)):
+        df_new = clean_ucic_frame(raw)
 
-    # Standardize column names
-    df_master.columns = df_master.columns.str.lower().str.strip()
-    df_new.columns = df_new.columns.str.lower().str.strip()
-
-    # Normalize and clean data
-    for df in [df_master, df_new]:
-        df.fillna("", inplace=True)
-        dob_column = 'dob' if 'dob' in df.columns else 'birth_date'
-        df['dob'] = pd.to_datetime(df[dob_column], errors='coerce', dayfirst=True).dt.date
-        df['first_name'] = df['first_name'].str.strip().str.upper()
-        df['last_name'] = df['last_name'].str.strip().str.upper()
-        df['organization_name'] = df.get('organization_name', '').str.strip().str.upper()
-        df['pan'] = df.get('pan', '').str.strip().str.upper()
-        df['aadhar_no'] = df.get('aadhar_no', '').astype(str).str.extract(r'(\d{4})$', expand=False).fillna("")
-
-    return df_master, df_new
+    return master, df_new, index
 
 
 # ---------- Step 2: PAN Validation ---------- #
@@ -36,71 +32,59 @@ def is_valid_pan(pan):
 
 # ---------- Step 3: Similarity Matching Logic ---------- #
 
-def find_ucic_match(new_row, df_master):
+def find_ucic_match(new_row, index):
     pan = new_row.get('pan', '').upper()
-    dob = new_row.get('dob')
-    first_name = new_row.get('first_name', '').strip().upper()
-    last_name = new_row.get('last_name', '').strip().upper()
-    org_name = new_row.get('organization_name', '').strip().upper()
+    dob = new_row.get('dob_day')
+    full_name = new_row.get('full_name', '')
+    org_name = new_row.get('organization_name_norm', '')
     aadhar_suffix = new_row.get('aadhar_no', '')
     party_tc = new_row.get('party_tc', '').strip().upper()
 
-    # Exclude master rows with missing UCIC
-    df_master_valid = df_master[df_master['ucic'].str.strip() != ""]
-
     # 1. PAN match if valid
     if pan and is_valid_pan(pan):
-        matched = df_master_valid[df_master_valid['pan'] == pan]
-        if not matched.empty:
-            return matched.iloc[0]['ucic']
+        ucic = index.lookup_pan(pan)
+        if ucic is not None:
+            return ucic
 
     # Determine individual or organization
     is_individual = (party_tc == "PERSON")
 
     if is_individual:
         # 2a. Match by Aadhar + DOB
-        if aadhar_suffix and dob:
-            matched = df_master_valid[
-                (df_master_valid['aadhar_no'] == aadhar_suffix) &
-                (df_master_valid['dob'] == dob) &
-                (df_master_valid['party_tc'].str.upper() == 'PERSON')
-            ]
-            if not matched.empty:
-                return matched.iloc[0]['ucic']
+        if aadhar_suffix and pd.notna(dob):
+            ucic = index.lookup_aadhar_dob(aadhar_suffix, dob)
+            if ucic is not None:
+                return ucic
 
         # 2b. Fuzzy match by name + DOB
-        potential = df_master_valid[
-            (df_master_valid['dob'] == dob) &
-            (df_master_valid['party_tc'].str.upper() == 'PERSON')
-        ]
-        for _, row in potential.iterrows():
-            name_score = token_sort_ratio(f"{first_name} {last_name}", f"{row['first_name']} {row['last_name']}")
-            if name_score >= 90:
-                return row['ucic']
+        return first_fuzzy_match(full_name, index.person_block(dob))
 
     else:
         # 3. Organization match by fuzzy org_name + DOB
-        if org_name and dob:
-            potential = df_master_valid[
-                (df_master_valid['dob'] == dob) &
-                (df_master_valid['party_tc'].str.upper() != 'PERSON')
-            ]
-            for _, row in potential.iterrows():
-                org_score = token_sort_ratio(org_name, row['organization_name'])
-                if org_score >= 90:
-                    return row['ucic']
+        if org_name and pd.notna(dob):
+            return first_fuzzy_match(org_name, index.org_block(dob))
 
     return None
 
 
 # ---------- Step 4: Match All Customers ---------- #
 
-def match_customers(df_master, df_new):
+def match_customers(master, df_new, index=None, batch=False, stats=None):
+    stats = stats or RunStats('match_customers')
+    if index is None:
+        with stats.stage("build index"):
+            index = MasterIndex.from_frame(master)
+
+    if batch:
+        # Whole-frame rules + one cdist per (party type, DOB) block
+        ucics = match_batch(df_new, index, first_hit=True, persons_only_pan=False, stats=stats)
+        return split_matches(df_new, ucics)
+
     matched = []
     unmatched = []
 
     for idx, row in df_new.iterrows():
-        ucic = find_ucic_match(row, df_master)
+        ucic = find_ucic_match(row, index)
         result = row.to_dict()
         if ucic:
             result['matched_ucic'] = ucic
@@ -108,17 +92,17 @@ def match_customers(df_master, df_new):
         else:
             unmatched.append(result)
 
-        if (idx + 1) % 5000 == 0:
-            print(f"Processed {idx + 1} records...")
+        stats.progress(idx + 1, len(df_new))
 
     return pd.DataFrame(matched), pd.DataFrame(unmatched)
 
 
 # ---------- Step 5: Output to Excel ---------- #
 
-def generate_reports(matched_df, unmatched_df):
-    matched_df.to_excel("matched_ucics.xlsx", index=False)
-    unmatched_df.to_excel("unmatched_ucics.xlsx", index=False)
+def generate_reports(matched_df, unmatched_df, fmt="xlsx"):
+    # Streaming writers: constant memory, sheet rollover past Excel's row limit
+    write_frame(matched_df, "matched_ucics", fmt)
+    write_frame(unmatched_df, "unmatched_ucics", fmt)
     print(f"\n✅ Matching complete.")
     print(f"🔍 Matched records: {len(matched_df)}")
     print(f"❌ Unmatched records: {len(unmatched_df)}")
@@ -127,9 +111,20 @@ def generate_reports(matched_df, unmatched_df):
 # ---------- Step 6: Main Pipeline ---------- #
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Match new customers to existing UCICs (first-hit rules)")
+    parser.add_argument("--format", default="xlsx", choices=OUTPUT_FORMATS, help="output file format")
+    parser.add_argument("--summary", default="match_customers_summary.json", help="JSON run summary path")
+    parser.add_argument("--profile", action="store_true", help="cProfile the matching stage (match_customers.prof)")
+    args = parser.parse_args()
+    stats = RunStats('match_customers')
+
     print("🚀 Loading and processing data...")
-    df_master, df_new = load_and_clean_data()
+    master, df_new, index = load_and_clean_data(stats)
     print("🔗 Matching UCICs...")
-    matched_df, unmatched_df = match_customers(df_master, df_new)
+    with stats.stage("match", rows=len(df_new)), profile(args.profile, "match_customers.prof"):
+        matched_df, unmatched_df = match_customers(master, df_new, index, batch=True, stats=stats)
     print("💾 Saving results...")
-    generate_reports(matched_df, unmatched_df)
+    with stats.stage("export", rows=len(df_new)):
+        generate_reports(matched_df, unmatched_df, args.format)
+    stats.counts.update(new_rows=len(df_new), matched=len(matched_df), unmatched=len(unmatched_df))
+    stats.write_summary(args.summary)
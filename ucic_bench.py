@@ -0,0 +1,386 @@
+import argparse
+import importlib.util
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from dob_parser import REPORT_DOB_FORMATS, days_to_dates, parse_dob
+from dup_cluster import cluster_assignments
+from dup_engine import valid_pans
+from dup_incremental import incremental_cluster_assignments, record_keys
+from name_normalize import add_canonical_names
+from run_stats import RunStats
+from ucic_clean import clean_ucic_frame, clean_ucic_record
+from ucic_index import RULES, MasterIndex, match_batch, match_record
+from ucic_parallel import match_sharded
+
+# ---------- UCIC Benchmark ---------- #
+# Generates a synthetic UCIC master, new-customer file and report_new
+# customer_data at a chosen scale, then times every implementation of the
+# same logic on it and checks they agree:
+#   - find_ucic_match (ucic_03) row-wise vs match_batch(first_hit=True)
+#   - find_ucic_match_fast (new_logic) row-wise vs match_batch vs sharded
+#   - the lookup service path (clean_ucic_record + match_record per raw
+#     record, with p50/p99 latency) vs match_batch
+#   - report_new name/org clustering, full vs incremental: cold from empty
+#     state, then warm over a changed frame (rows dropped, renamed, added),
+#     so the dirty-block path runs too
+# Row-wise matchers are timed on the first --rowwise-rows new rows only.
+# Prints rows/sec, peak RSS and per-rule hits; exits with status 1 if two
+# implementations assign a different UCIC (or cluster) to the same input.
+#
+#   python ucic_bench.py --master-rows 1000000 --new-rows 100000 --workers 8
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# ---------- Synthetic Data ---------- #
+
+SYLLABLES = ["ra", "ma", "sh", "an", "ki", "su", "vi", "de", "pr", "ka", "la", "ni", "ta",
+             "ja", "ya", "ha", "ri", "go", "pa", "na", "sa", "mi", "ve", "ro", "bh", "ch"]
+LAST_NAMES = ["SHARMA", "VERMA", "GUPTA", "SINGH", "KUMAR", "PATEL", "REDDY", "NAIR", "IYER",
+              "JOSHI", "MEHTA", "SHAH", "RAO", "DAS", "BOSE", "KHAN", "ALI", "YADAV", "MISHRA",
+              "PANDEY", "CHOPRA", "MALHOTRA", "KAPOOR", "AGARWAL", "BANERJEE", "MUKHERJEE"]
+ORG_WORDS = ["SHREE", "GANESH", "GLOBAL", "NEW AGE", "SUNRISE", "BHARAT", "NATIONAL", "UNITED",
+             "APEX", "PIONEER", "LAKSHMI", "OM", "SAI", "KRISHNA", "ROYAL", "STAR", "METRO"]
+ORG_TRADES = ["TRADERS", "ENTERPRISES", "INDUSTRIES", "FOODS", "TECH SOLUTIONS", "TEXTILES",
+              "MOTORS", "PHARMA", "LOGISTICS", "AGENCIES", "EXPORTS", "BUILDERS"]
+ORG_SUFFIXES = ["PVT LTD", "LTD", "LLP", "& CO", ""]
+# Placeholder DOBs that pile up in real dumps, with their share of rows
+DEFAULT_DOBS = {"01-01-1900": 0.04, "01-01-1970": 0.01}
+DUMMY_PANS = ["AAAAA0000A", "XXXXX9999X", "ABCDE1234F", "AAAAA1234A"]
+LETTERS = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+
+
+def _pick(rng, pool, n):
+    return np.asarray(pool, dtype=object)[rng.integers(0, len(pool), n)]
+
+
+def _first_names(rng, n):
+    # 2-3 syllable names give a few thousand distinct first names
+    parts = [_pick(rng, SYLLABLES, n) for _ in range(3)]
+    third = np.where(rng.random(n) < 0.4, parts[2], "")
+    return pd.Series(parts[0] + parts[1] + third).str.upper().to_numpy(dtype=object)
+
+
+def _org_names(rng, n):
+    names = pd.Series(_pick(rng, ORG_WORDS, n)) + " " + _pick(rng, ORG_TRADES, n) + " " + _pick(rng, ORG_SUFFIXES, n)
+    return names.str.strip().to_numpy(dtype=object)
+
+
+def _dobs(rng, n):
+    """DOB strings: placeholder heaps, a 1 Jan heap, mixed formats, junk."""
+    years = np.clip(rng.normal(1985, 12, n).round(), 1930, 2005).astype(int)
+    day_of_year = rng.integers(0, 365, n)
+    day_of_year[rng.random(n) < 0.03] = 0
+    dates = pd.to_datetime(pd.Series(years).astype(str) + "-01-01") + pd.to_timedelta(day_of_year, unit='D')
+    r = rng.random(n)
+    out = np.where(r < 0.85, dates.dt.strftime("%d-%m-%Y"),
+                   np.where(r < 0.95, dates.dt.strftime("%Y-%m-%d"), dates.dt.strftime("%d/%m/%Y"))).astype(object)
+    r = rng.random(n)
+    start = 0.0
+    for dob, share in DEFAULT_DOBS.items():
+        out[(r >= start) & (r < start + share)] = dob
+        start += share
+    out[(r >= start) & (r < start + 0.02)] = ""
+    out[(r >= start + 0.02) & (r < start + 0.025)] = "NA"
+    return out
+
+
+def _pans(rng, is_person):
+    n = len(is_person)
+    letters = LETTERS[rng.integers(0, 26, (n, 5))]
+    # 4th letter is the holder type: P(erson), C(ompany), F(irm), H(UF)
+    letters[:, 3] = np.where(is_person, "P", _pick(rng, ["C", "F", "H"], n))
+    digits = rng.integers(0, 10_000, n)
+    prefix = np.ascontiguousarray(letters, dtype='<U1').view('<U5').ravel()
+    pans = pd.Series(prefix, dtype=object) + pd.Series(digits).astype(str).str.zfill(4) + LETTERS[rng.integers(0, 26, n)]
+    pans = pans.to_numpy(dtype=object)
+    r = rng.random(n)
+    pans[r < 0.25] = ""
+    dummy = (r >= 0.25) & (r < 0.30)
+    pans[dummy] = _pick(rng, DUMMY_PANS, int(dummy.sum()))
+    invalid = (r >= 0.30) & (r < 0.35)
+    pans[invalid] = pd.Series(pans[invalid]).str[:8].str.lower().to_numpy(dtype=object)
+    return pans
+
+
+def _typos(rng, names, rate):
+    """Drop, swap or replace one character in a `rate` share of the names."""
+    names = names.copy()
+    for i in np.flatnonzero(rng.random(len(names)) < rate):
+        name = names[i]
+        if len(name) < 3:
+            continue
+        pos = int(rng.integers(1, len(name) - 1))
+        kind = rng.integers(0, 3)
+        if kind == 0:
+            names[i] = name[:pos] + name[pos + 1:]
+        elif kind == 1:
+            names[i] = name[:pos - 1] + name[pos] + name[pos - 1] + name[pos + 1:]
+        else:
+            names[i] = name[:pos] + str(LETTERS[rng.integers(0, 26)]) + name[pos + 1:]
+    return names
+
+
+def synthetic_master(n, seed=0, person_share=0.8, repeat_share=0.1):
+    """Raw UCIC dump rows (all strings, like read_csv(dtype=str))."""
+    rng = np.random.default_rng(seed)
+    is_person = rng.random(n) < person_share
+    df = pd.DataFrame({
+        'ucic': ("U" + pd.Series(np.arange(n)).astype(str).str.zfill(9)).to_numpy(dtype=object),
+        'party_tc': np.where(is_person, "PERSON", "ORGANIZATION").astype(object),
+        'first_name': np.where(is_person, _first_names(rng, n), ""),
+        'last_name': np.where(is_person, _pick(rng, LAST_NAMES, n), ""),
+        'organization_name': np.where(is_person, "", _org_names(rng, n)),
+        'pan': _pans(rng, is_person),
+        'aadhar_no': np.where(rng.random(n) < 0.5, pd.Series(rng.integers(10**11, 10**12, n)).astype(str), ""),
+        'dob': _dobs(rng, n),
+    })
+    # The same customer appearing on several rows under one UCIC
+    repeats = np.flatnonzero(rng.random(n) < repeat_share)
+    repeats = repeats[repeats > 0]
+    source = (rng.random(len(repeats)) * repeats).astype(int)
+    df.iloc[repeats] = df.iloc[source].to_numpy()
+    return df
+
+
+def synthetic_new(master, n, seed=1, overlap=0.6):
+    """Raw new-customer rows: `overlap` of them perturbed copies of master
+    customers (dropped PAN/Aadhar, typos, other DOB format), the rest new."""
+    rng = np.random.default_rng(seed)
+    known = rng.random(n) < overlap
+    fresh = synthetic_master(n, seed=seed + 1000).drop(columns='ucic')
+    picked = master.iloc[rng.integers(0, len(master), n)].drop(columns='ucic').reset_index(drop=True)
+    df = fresh.copy()
+    df.loc[known] = picked.loc[known].to_numpy()
+    for col, rate in [('pan', 0.4), ('aadhar_no', 0.5)]:
+        df.loc[known & (rng.random(n) < rate), col] = ""
+    reformat = known & (rng.random(n) < 0.3)
+    dates = pd.to_datetime(df.loc[reformat, 'dob'], format="%d-%m-%Y", errors='coerce')
+    df.loc[reformat, 'dob'] = dates.dt.strftime("%d/%m/%Y").where(dates.notna(), df.loc[reformat, 'dob'])
+    for col in ['first_name', 'last_name', 'organization_name']:
+        df[col] = _typos(rng, df[col].to_numpy(dtype=object), 0.15)
+    return df.rename(columns={'dob': 'birth_date'})
+
+
+def synthetic_customers(n, seed=2, dup_share=0.1):
+    """report_new customer_data rows with near-duplicates under other UCICs."""
+    rng = np.random.default_rng(seed)
+    df = synthetic_master(n, seed=seed, repeat_share=0.0)
+    df = df[['ucic', 'pan', 'dob', 'first_name', 'last_name', 'organization_name']]
+    dups = np.flatnonzero(rng.random(n) < dup_share)
+    copies = df.iloc[rng.integers(0, n, len(dups))].reset_index(drop=True)
+    copies['ucic'] = df['ucic'].to_numpy()[dups]
+    for col in ['first_name', 'last_name', 'organization_name']:
+        copies[col] = _typos(rng, copies[col].to_numpy(dtype=object), 0.5)
+    df.iloc[dups] = copies.to_numpy()
+    return df
+
+
+def synthetic_changes(df, seed=3, share=0.02):
+    """customer_data df with a share of its rows dropped, a share renamed
+    and a share of new rows appended: the delta of a later report run."""
+    rng = np.random.default_rng(seed)
+    n = len(df)
+    df = df[rng.random(n) >= share].copy()
+    renamed = np.flatnonzero(rng.random(len(df)) < share)
+    for col in ['first_name', 'organization_name']:
+        names = df[col].to_numpy(dtype=object)
+        names[renamed] = _typos(rng, names[renamed], 1.0)
+        df[col] = names
+    return pd.concat([df, synthetic_customers(int(n * share), seed=seed)], ignore_index=True)
+
+
+# ---------- Measurement ---------- #
+
+def _reset_peak_rss():
+    # Linux only: lets VmHWM measure one phase instead of the whole run
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(label, rows, func, *args, **kwargs):
+    _reset_peak_rss()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    rate = rows / elapsed if elapsed else float('inf')
+    print(f"⏱️  {label:<34} {rows:>10} rows {elapsed:>9.2f}s {rate:>12,.0f} rows/s  peak RSS {_peak_rss_mb():,.0f} MiB")
+    return result
+
+
+def _load_script(name, filename):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _ucics_by_row(matched, n):
+    """Matched UCIC per bench_row from a matcher's (matched, unmatched) pair."""
+    ucics = pd.Series(None, index=range(n), dtype=object)
+    if len(matched):
+        ucics[matched['bench_row'].to_numpy()] = matched['matched_ucic'].to_numpy(dtype=object)
+    return ucics
+
+
+def _compare(label, expected, actual):
+    diff = ~((expected == actual) | (expected.isna() & actual.isna()))
+    if diff.any():
+        print(f"❌ {label}: {int(diff.sum())} rows differ, e.g. rows {list(diff[diff].index[:5])}")
+        return False
+    print(f"✅ {label}: identical ({int(expected.notna().sum())} matched)")
+    return True
+
+
+def _print_rules(label, hits, rows):
+    parts = ", ".join(f"{rule} {hits[rule]}" for rule in RULES)
+    print(f"📊 {label} rule hits: {parts}; unmatched {rows - sum(hits.values())}")
+
+
+# ---------- Benchmarks ---------- #
+
+def _bench_records(records, index, batch):
+    """ucic_service's per-request path, one raw record at a time."""
+    ucics, latencies = [], []
+    for record in records:
+        start = time.perf_counter()
+        ucic, _ = match_record(clean_ucic_record(record), index, dob_fallback=True)
+        latencies.append(time.perf_counter() - start)
+        ucics.append(ucic)
+    if not records:
+        return True
+    p50, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 99])
+    print(f"⏱️  {'single-record lookup':<34} {len(records):>10} rows  p50 {p50:.2f} ms  p99 {p99:.2f} ms")
+    return _compare("single-record lookup vs batch", batch[:len(records)], pd.Series(ucics, dtype=object))
+
+
+def bench_matchers(args):
+    ok = True
+    print(f"🧪 Generating {args.master_rows} master / {args.new_rows} new rows...")
+    raw_master = synthetic_master(args.master_rows, seed=args.seed)
+    raw_new = synthetic_new(raw_master, args.new_rows, seed=args.seed + 1)
+    if args.save:
+        raw_master.to_csv(os.path.join(args.save, "UCIC_Dump.csv"), index=False)
+        raw_new.to_csv(os.path.join(args.save, "new_customers.csv"), index=False)
+
+    # Raw records for the service path (clean_ucic_frame cleans in place)
+    records = raw_new.iloc[:args.rowwise_rows].to_dict('records')
+    df_master = _measure("clean master", len(raw_master), clean_ucic_frame, raw_master)
+    df_new = _measure("clean new file", len(raw_new), clean_ucic_frame, raw_new)
+    df_new['bench_row'] = np.arange(len(df_new))
+    index = _measure("build MasterIndex", len(df_master), MasterIndex.from_frame, df_master)
+    print(f"📦 Master store: {index.store.nbytes() / 2**20:,.1f} MiB "
+          f"(cleaned frame {df_master.memory_usage(deep=True).sum() / 2**20:,.1f} MiB)")
+    del raw_master, df_master
+
+    logic_a = _load_script("ucic_logic_a", "ucic_03-06-2025.py")
+    logic_b = _load_script("ucic_logic_b", "new_logic._04-06-2025.py")
+    sample = df_new.iloc[:args.rowwise_rows]
+    n = len(df_new)
+
+    results = {}
+    for label, module, func, match_kwargs in [
+        ("find_ucic_match", logic_a, 'match_customers', {'first_hit': True, 'persons_only_pan': False}),
+        ("find_ucic_match_fast", logic_b, 'match_all', {'dob_fallback': True}),
+    ]:
+        stats = RunStats(label, show_progress=False)
+        batch = _measure(f"{label} batch", n, match_batch, df_new, index, stats=stats, **match_kwargs)
+        _print_rules(label, stats.rule_hits, n)
+        results[label] = batch
+        matched, _ = _measure(f"{label} row-wise", len(sample), getattr(module, func), None, sample, index)
+        ok &= _compare(f"{label} row-wise vs batch", _ucics_by_row(matched, len(sample)), batch[:len(sample)])
+        if args.workers > 1:
+            sharded = _measure(f"{label} sharded x{args.workers}", n, match_sharded,
+                               df_new, index, args.workers, **match_kwargs)
+            ok &= _compare(f"{label} sharded vs batch", batch, sharded)
+
+    ok &= _bench_records(records, index, results["find_ucic_match_fast"])
+
+    # The two matchers implement different rules, so this is informational
+    a, b = results["find_ucic_match"], results["find_ucic_match_fast"]
+    disagree = int((~((a == b) | (a.isna() & b.isna()))).sum())
+    print(f"ℹ️  find_ucic_match vs find_ucic_match_fast disagree on {disagree} of {n} rows")
+    return ok
+
+
+def _report_candidates(raw):
+    """Clean customer_data the way report_new.py does; name/org candidates."""
+    df = raw.copy()
+    df['pan'] = df['pan'].astype(str).str.strip().str.upper()
+    df['dob_day'], _ = parse_dob(df['dob'], REPORT_DOB_FORMATS)
+    df['dob'] = days_to_dates(df['dob_day'])
+    df = add_canonical_names(df)
+    invalid = df[~valid_pans(df['pan']).to_numpy()]
+    has_dob = invalid['dob_day'].notna()
+    return (invalid[(invalid['full_name'] != '') & has_dob],
+            invalid[(invalid['organization_name_norm'] != '') & has_dob])
+
+
+def bench_clustering(args):
+    ok = True
+    print(f"🧪 Generating {args.customer_rows} customer_data rows...")
+    raw = synthetic_customers(args.customer_rows, seed=args.seed + 2)
+    if args.save:
+        raw.to_csv(os.path.join(args.save, "customer_data.csv"), index=False)
+    # The warm pass reuses the cold pass's state on a changed frame
+    runs = [("cold", raw), ("warm", synthetic_changes(raw, seed=args.seed + 3))]
+    with tempfile.TemporaryDirectory() as state_dir:
+        for run, frame in runs:
+            keys = record_keys(frame)
+            names, orgs = _measure(f"report_new prepare ({run})", len(frame), _report_candidates, frame)
+            for label, candidates, col in [("name clustering", names, 'full_name'),
+                                           ("org clustering", orgs, 'organization_name_norm')]:
+                full = _measure(f"{label} full", len(candidates), cluster_assignments, candidates, col)
+                state = os.path.join(state_dir, f"{col}.parquet")
+                incremental = _measure(f"{label} incremental ({run})", len(candidates),
+                                       incremental_cluster_assignments, candidates, keys[candidates.index], col, state)
+                clustered = int((full['cluster_id'] > 0).sum())
+                if full.equals(incremental):
+                    print(f"✅ {label} ({run}): full vs incremental identical ({clustered} rows in "
+                          f"{int(full['cluster_id'].max())} clusters)")
+                else:
+                    print(f"❌ {label} ({run}): full vs incremental cluster assignments differ")
+                    ok = False
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark and cross-check the UCIC matchers and clustering")
+    parser.add_argument("--master-rows", type=int, default=100_000)
+    parser.add_argument("--new-rows", type=int, default=10_000)
+    parser.add_argument("--customer-rows", type=int, default=50_000, help="customer_data rows for clustering")
+    parser.add_argument("--rowwise-rows", type=int, default=2_000, help="new rows run through the row-wise matchers")
+    parser.add_argument("--workers", type=int, default=1, help="also run sharded matching with this many processes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip", choices=["matching", "clustering"], help="leave one benchmark out")
+    parser.add_argument("--save", help="directory to also write the generated CSVs to")
+    args = parser.parse_args()
+
+    ok = True
+    if args.skip != "matching":
+        ok &= bench_matchers(args)
+    if args.skip != "clustering":
+        ok &= bench_clustering(args)
+    if not ok:
+        print("❌ Implementations disagree")
+        raise SystemExit(1)
+    print("✅ All implementations agree")
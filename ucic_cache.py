@@ -0,0 +1,136 @@
+import hashlib
+import io
+import os
+
+import pandas as pd
+
+from dob_parser import format_stats, summed_stats
+from run_stats import RunStats
+from state_files import dump_pickle, file_stamp, load_pickle, read_meta, save_stamped, write_meta
+from ucic_clean import CLEAN_VERSION, clean_ucic_frame
+from ucic_index import MasterIndex
+from ucic_store import MasterStore
+
+# ---------- Cached Master Loader ---------- #
+# The cleaned UCIC master is kept as a pickled MasterIndex (which carries the
+# compact MasterStore), keyed on the dump's size, mtime and SHA-256 plus
+# ucic_clean.CLEAN_VERSION and CACHE_LAYOUT. Later runs load the cache
+# instead of re-parsing and re-cleaning the CSV. When the new dump only
+# appends rows to the cached one (same leading bytes), just the appended
+# tail is parsed, cleaned and folded into the cached store and index.
+# The dump itself is read MASTER_CHUNK_ROWS rows at a time, so the all-string
+# frame never exists for more than one chunk.
+
+CACHE_DIR = ".ucic_cache"
+HASH_BLOCK = 1 << 24
+MASTER_CHUNK_ROWS = 500_000
+# Bump whenever the pickled index / store layout changes
+CACHE_LAYOUT = 3
+
+
+def _cache_paths(path, cache_dir):
+    stem = os.path.join(cache_dir, os.path.basename(path))
+    return stem + ".index.pkl", stem + ".meta.json"
+
+
+def _hash_file(path, prefix_size=None):
+    """SHA-256 of the whole file, plus of its first prefix_size bytes."""
+    digest = hashlib.sha256()
+    prefix_digest = None
+    remaining = prefix_size
+    with open(path, 'rb') as f:
+        while True:
+            if remaining is not None and remaining < HASH_BLOCK:
+                block = f.read(remaining)
+                digest.update(block)
+                prefix_digest = digest.hexdigest()
+                remaining = None
+                continue
+            block = f.read(HASH_BLOCK)
+            if not block:
+                break
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return digest.hexdigest(), prefix_digest
+
+
+def _read_master(path, stats):
+    chunks = pd.read_csv(path, dtype=str, chunksize=MASTER_CHUNK_ROWS)
+    # DOB counts of all chunks, printed once for the whole dump
+    read_stats = RunStats('read_master', show_progress=False)
+    store = MasterStore.concat(MasterStore.from_frame(clean_ucic_frame(chunk, read_stats, 'master dob'))
+                               for chunk in chunks)
+    print(format_stats(summed_stats(read_stats.tallies.get('master dob', {})), 'master'))
+    stats.merge(read_stats)
+    return store
+
+
+def _read_appended(path, offset):
+    """Parse only the rows after byte offset, reusing the file's header."""
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(offset)
+        tail = f.read()
+    return clean_ucic_frame(pd.read_csv(io.BytesIO(header + tail), dtype=str))
+
+
+def _ends_with_newline(path, size):
+    with open(path, 'rb') as f:
+        f.seek(size - 1)
+        return f.read(1) == b"\n"
+
+
+def load_master(path="UCIC_Dump.csv", cache_dir=CACHE_DIR, stats=None):
+    """Compact UCIC master (MasterStore) and its MasterIndex, from cache
+    where possible. Load / clean / index build stages are timed in stats."""
+    if stats is None:
+        stats = RunStats('load_master', show_progress=False)
+    paths = _cache_paths(path, cache_dir)
+    stamp = file_stamp(path)
+    if stamp is None:
+        raise FileNotFoundError(path)
+
+    meta = read_meta(paths)
+    if meta and (meta.get('clean_version') != CLEAN_VERSION or meta.get('layout') != CACHE_LAYOUT):
+        meta = None
+
+    # Unchanged file: trust size + mtime without re-hashing
+    if meta and meta['size'] == stamp['size'] and meta['mtime'] == stamp['mtime']:
+        print("⚡ Using cached UCIC master")
+        with stats.stage("load cached master"):
+            index = load_pickle(paths[0])
+        return index.store, index
+
+    appended = meta is not None and stamp['size'] > meta['size']
+    with stats.stage("hash master dump"):
+        sha256, prefix_sha256 = _hash_file(path, meta['size'] if appended else None)
+    new_meta = dict(stamp, sha256=sha256, clean_version=CLEAN_VERSION, layout=CACHE_LAYOUT)
+
+    if meta and sha256 == meta['sha256']:
+        # Touched but identical: refresh the stamp only
+        print("⚡ Using cached UCIC master")
+        write_meta(paths, new_meta)
+        with stats.stage("load cached master"):
+            index = load_pickle(paths[0])
+        return index.store, index
+
+    if appended and prefix_sha256 == meta['sha256'] and _ends_with_newline(path, meta['size']):
+        with stats.stage("load cached master"):
+            index = load_pickle(paths[0])
+        with stats.stage("load + clean appended master rows"):
+            df_delta = _read_appended(path, meta['size'])
+        print(f"➕ Folding {len(df_delta)} appended master rows into cache")
+        with stats.stage("build index", rows=len(index.store) + len(df_delta)):
+            index.update(df_delta)
+    else:
+        print("🧹 Cleaning full UCIC master (cache miss)")
+        with stats.stage("load + clean master"):
+            store = _read_master(path, stats)
+        with stats.stage("build index", rows=len(store)):
+            index = MasterIndex.from_store(store)
+
+    print(f"📦 Master store: {len(index.store)} rows, {index.store.nbytes() / 2**20:.1f} MiB")
+    with stats.stage("write master cache"):
+        save_stamped(paths, dump_pickle(index), new_meta)
+    return index.store, index
@@ -0,0 +1,76 @@
+import datetime
+import re
+
+import pandas as pd
+
+from dob_parser import EPOCH, UCIC_DOB_FORMATS, days_to_dates, format_stats, parse_dob, parse_dob_value
+from name_normalize import add_canonical_names, canonical_name, clean_text
+
+# ---------- Shared Cleaning ---------- #
+# One cleaning pass for both the UCIC master dump and the new-customer file,
+# used by both matchers and by the cached master loader. Bump CLEAN_VERSION
+# whenever the output changes, so cached masters get rebuilt.
+# clean_ucic_record applies the same rules to a single dict, for the lookup
+# service, where a pandas round trip per request would cost ~30 ms.
+
+CLEAN_VERSION = 3
+
+_AADHAR_LAST4 = re.compile(r'(\d{4})$')
+
+
+def _column(df, name):
+    # Missing optional columns clean to empty strings
+    if name in df.columns:
+        return df[name]
+    return pd.Series("", index=df.index)
+
+
+def clean_ucic_frame(df, stats=None, topic='dob'):
+    """Standardise columns and values of a raw UCIC frame (in place).
+
+    The DOB parse counts are printed, or with stats (a RunStats) tallied
+    under topic, for callers that clean chunk by chunk and print them once.
+    """
+    df.columns = df.columns.str.lower().str.strip()
+    df.fillna("", inplace=True)
+    dob_col = 'dob' if 'dob' in df.columns else 'birth_date'
+    # dob_day (Int32 days since epoch) is the blocking key; dob stays a date for reports
+    df['dob_day'], dob_stats = parse_dob(df[dob_col], UCIC_DOB_FORMATS, fallback_dayfirst=True)
+    df['dob'] = days_to_dates(df['dob_day'])
+    if stats is None:
+        print(format_stats(dob_stats))
+    else:
+        stats.tally(topic, dob_stats._asdict())
+    df['first_name'] = clean_text(_column(df, 'first_name'))
+    df['last_name'] = clean_text(_column(df, 'last_name'))
+    df['organization_name'] = clean_text(_column(df, 'organization_name'))
+    df['pan'] = clean_text(_column(df, 'pan'))
+    df['aadhar_no'] = _column(df, 'aadhar_no').astype(str).str.extract(r'(\d{4})$', expand=False).fillna("")
+    df['party_tc'] = clean_text(_column(df, 'party_tc'))
+    df['ucic'] = _column(df, 'ucic').str.strip()
+    # Canonical full_name / organization_name_norm used for fuzzy matching
+    return add_canonical_names(df)
+
+
+def _text(value):
+    # fillna("") + astype(str) for one value
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return str(value)
+
+
+def clean_ucic_record(record):
+    """clean_ucic_frame for one raw record (dict of column -> value)."""
+    rec = {str(key).lower().strip(): value for key, value in record.items()}
+    dob_col = 'dob' if 'dob' in rec else 'birth_date'
+    rec['dob_day'] = parse_dob_value(rec.get(dob_col), UCIC_DOB_FORMATS, fallback_dayfirst=True)
+    rec['dob'] = None if rec['dob_day'] is None else EPOCH + datetime.timedelta(days=rec['dob_day'])
+    for col in ['first_name', 'last_name', 'organization_name', 'pan', 'party_tc']:
+        rec[col] = _text(rec.get(col)).strip().upper()
+    aadhar = _AADHAR_LAST4.search(_text(rec.get('aadhar_no')))
+    rec['aadhar_no'] = aadhar.group(1) if aadhar else ""
+    rec['ucic'] = _text(rec.get('ucic')).strip()
+    for col in ['first_name', 'last_name', 'organization_name']:
+        rec[f'{col}_norm'] = canonical_name(rec[col])
+    rec['full_name'] = (rec['first_name_norm'] + ' ' + rec['last_name_norm']).strip()
+    return rec
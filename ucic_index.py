@@ -0,0 +1,390 @@
+import re
+import time
+
+import numpy as np
+import pandas as pd
+from collections import namedtuple
+from rapidfuzz import process, fuzz
+
+from run_stats import RunStats
+from ucic_name_index import NameIndex
+from ucic_store import MISSING_DOB, PAN_WIDTH, MasterStore, encode_aadhar, encode_dob, encode_pans
+
+# ---------- Master Index ---------- #
+# Built once from the compact master store (see ucic_store) so that every
+# lookup only touches its PAN / Aadhar+DOB entry or the master rows sharing
+# its DOB, instead of re-scanning the whole master per incoming record.
+# All lookup structures are sorted numpy arrays searched with searchsorted:
+#   PAN           -> first master row with that PAN
+#   DOB * 10^4 + Aadhar last 4 -> first person row with that pair
+#   DOB blocks    -> person / organization rows per DOB, in master order
+# Candidate names are decoded from the store's dictionaries on lookup.
+
+CandidateBlock = namedtuple('CandidateBlock', ['names', 'ucics'])
+
+EMPTY_BLOCK = CandidateBlock([], [])
+
+PAN_PATTERN = r'^[A-Z]{5}[0-9]{4}[A-Z]$'
+
+# Blocks with at least this many candidates (placeholder DOBs) are kept
+# token-sorted for single-record lookups, see MasterIndex.prepared_block.
+LARGE_BLOCK = 2_000
+
+# Upper bound on the cells of one cdist score matrix (~128 MB of float64),
+# so a huge default-DOB block is scored in slices instead of all at once.
+BATCH_MAX_CELLS = 1 << 24
+
+
+def _first_rows(keys, rows):
+    """Sorted distinct keys and, per key, the first of rows carrying it."""
+    keys, first = np.unique(keys, return_index=True)
+    return keys, rows[first]
+
+
+def _find(keys, rows, queries):
+    """Row per query (-1 where the key is absent)."""
+    found = np.full(len(queries), -1, dtype=np.int64)
+    if len(keys) == 0:
+        return found
+    at = np.searchsorted(keys, queries).clip(max=len(keys) - 1)
+    hit = keys[at] == queries
+    found[hit] = rows[at[hit]]
+    return found
+
+
+def _build_blocks(dobs, rows):
+    """Rows grouped by DOB, master order kept inside each block."""
+    order = np.argsort(dobs[rows], kind='stable')
+    rows = rows[order]
+    block_dobs, starts = np.unique(dobs[rows], return_index=True)
+    return block_dobs, np.append(starts, len(rows)), rows
+
+
+def sort_tokens(name):
+    """Tokens of name in sorted order: fuzz.ratio of two token-sorted names
+    is exactly their fuzz.token_sort_ratio."""
+    return " ".join(sorted(name.split()))
+
+
+def _aadhar_keys(dobs, aadhar):
+    return dobs.astype(np.int64) * 10_000 + aadhar
+
+
+def _as_dob(dob):
+    return MISSING_DOB if pd.isna(dob) else int(dob)
+
+
+class MasterIndex:
+
+    def __init__(self, store):
+        self.store = store
+        self._build()
+
+    def _build(self):
+        store = self.store
+        # Exclude master rows with missing UCIC
+        usable_ucic = (store.ucic.categories.str.strip() != "")[store.ucic.codes]
+        usable_ucic &= store.ucic.codes >= 0
+        is_person = (store.party_tc.categories.str.strip().str.upper() == 'PERSON')[store.party_tc.codes]
+        is_person &= store.party_tc.codes >= 0
+        valid = np.flatnonzero(usable_ucic)
+        persons = np.flatnonzero(usable_ucic & is_person)
+        orgs = np.flatnonzero(usable_ucic & ~is_person)
+        # Rows behind the DOB-free name indexes, which are built on first use
+        self._name_rows = {True: persons, False: orgs}
+        self._name_indexes = {}
+        self._prepared = {}
+
+        # PAN -> UCIC (first master row wins, as with .iloc[0] on a mask)
+        with_pan = valid[store.pan[valid] != b""]
+        self.pan_all = _first_rows(store.pan[with_pan], with_pan)
+        with_pan = persons[store.pan[persons] != b""]
+        self.pan_persons = _first_rows(store.pan[with_pan], with_pan)
+
+        # Only rows with a parsed DOB can ever match on DOB
+        persons = persons[store.dob_day[persons] != MISSING_DOB]
+        orgs = orgs[store.dob_day[orgs] != MISSING_DOB]
+
+        # (DOB, Aadhar last 4) -> UCIC
+        with_aadhar = persons[store.aadhar[persons] >= 0]
+        keys = _aadhar_keys(store.dob_day[with_aadhar], store.aadhar[with_aadhar])
+        self.aadhar_dob = _first_rows(keys, with_aadhar)
+
+        # DOB -> candidate rows (names are decoded from the store per lookup)
+        self.person_blocks = _build_blocks(store.dob_day, persons)
+        self.org_blocks = _build_blocks(store.dob_day, orgs)
+
+    @classmethod
+    def from_store(cls, store):
+        return cls(store)
+
+    @classmethod
+    def from_frame(cls, df_master):
+        """Index for a cleaned master frame (or an already built MasterStore)."""
+        if isinstance(df_master, MasterStore):
+            return cls(df_master)
+        return cls(MasterStore.from_frame(df_master))
+
+    def update(self, df_appended):
+        """Fold rows appended to the end of the master into the index.
+
+        Appended rows come after every indexed row, so rebuilding the
+        (vectorized) lookup arrays keeps existing first-match entries and
+        puts new candidates at the end of their DOB block.
+        """
+        self.store = MasterStore.concat([self.store, MasterStore.from_frame(df_appended)])
+        self._build()
+        return self
+
+    def _ucics(self, rows):
+        """UCIC per row position (None for -1)."""
+        result = np.full(len(rows), None, dtype=object)
+        hit = rows >= 0
+        categories = np.asarray(self.store.ucic.categories, dtype=object)
+        result[hit] = categories[self.store.ucic.codes[rows[hit]]]
+        return result
+
+    def lookup_pans(self, pans, persons_only=False):
+        """UCIC per PAN of an array of (valid) PANs, None where unknown."""
+        keys, rows = self.pan_persons if persons_only else self.pan_all
+        return self._ucics(_find(keys, rows, encode_pans(pans)))
+
+    def lookup_aadhar_dobs(self, aadhar, dobs):
+        """UCIC per (Aadhar last 4, DOB day) pair, None where unknown."""
+        keys, rows = self.aadhar_dob
+        dobs, aadhar = encode_dob(dobs), encode_aadhar(aadhar)
+        found = _find(keys, rows, _aadhar_keys(dobs, aadhar))
+        found[(dobs == MISSING_DOB) | (aadhar < 0)] = -1
+        return self._ucics(found)
+
+    def _lookup(self, keys, rows, key):
+        at = np.searchsorted(keys, key)
+        if at == len(keys) or keys[at] != key:
+            return None
+        return self.store.ucic[rows[at]]
+
+    def lookup_pan(self, pan, persons_only=False):
+        if not pan or len(pan) > PAN_WIDTH or not pan.isascii():
+            return None
+        return self._lookup(*(self.pan_persons if persons_only else self.pan_all), pan.encode())
+
+    def lookup_aadhar_dob(self, aadhar, dob):
+        if pd.isna(dob) or not aadhar or not aadhar.isdigit():
+            return None
+        return self._lookup(*self.aadhar_dob, int(_aadhar_keys(np.int32(_as_dob(dob)), int(aadhar))))
+
+    def _block_rows(self, blocks, dob):
+        block_dobs, starts, rows = blocks
+        at = np.searchsorted(block_dobs, _as_dob(dob))
+        if at == len(block_dobs) or block_dobs[at] != _as_dob(dob):
+            return rows[:0]
+        return rows[starts[at]:starts[at + 1]]
+
+    def _block(self, blocks, names, dob):
+        rows = self._block_rows(blocks, dob)
+        if len(rows) == 0:
+            return EMPTY_BLOCK
+        names = np.asarray(names.categories, dtype=object)[names.codes[rows]]
+        return CandidateBlock(names.tolist(), self._ucics(rows).tolist())
+
+    def person_block(self, dob):
+        return self._block(self.person_blocks, self.store.full_name, dob)
+
+    def org_block(self, dob):
+        return self._block(self.org_blocks, self.store.org_name, dob)
+
+    def prepared_block(self, person, dob):
+        """The DOB block with token-sorted names (score with fuzz.ratio) if
+        it has at least LARGE_BLOCK candidates, else None. Kept after first
+        use: decoding and re-sorting a placeholder-DOB block of tens of
+        thousands of names would otherwise dominate every lookup into it."""
+        key = (person, _as_dob(dob))
+        if key not in self._prepared:
+            rows = self._block_rows(self.person_blocks if person else self.org_blocks, dob)
+            if len(rows) < LARGE_BLOCK:
+                return None
+            block = self.person_block(dob) if person else self.org_block(dob)
+            self._prepared[key] = CandidateBlock([sort_tokens(name) for name in block.names], block.ucics)
+        return self._prepared[key]
+
+    def prepare_large_blocks(self):
+        """Prepare every block of at least LARGE_BLOCK candidates up front."""
+        for person, (block_dobs, starts, _) in [(True, self.person_blocks), (False, self.org_blocks)]:
+            for dob in block_dobs[np.diff(starts) >= LARGE_BLOCK]:
+                self.prepared_block(person, dob)
+        return len(self._prepared)
+
+    def name_index(self, person):
+        """Trigram NameIndex over all person (or organization) rows, regardless of DOB."""
+        if person not in self._name_indexes:
+            names = self.store.full_name if person else self.store.org_name
+            self._name_indexes[person] = NameIndex.from_codes(names.codes, names.categories, self._name_rows[person])
+        return self._name_indexes[person]
+
+    def lookup_name(self, name, person, cutoff=90):
+        """UCIC of the best fuzzy match for name over the whole master
+        (fallback tier for records without a usable DOB), None below cutoff."""
+        if not name:
+            return None
+        row = self.name_index(person).best_row(name, cutoff)
+        return None if row < 0 else self.store.ucic[row]
+
+
+# ---------- Fuzzy Block Search ---------- #
+
+def first_fuzzy_match(query, block, cutoff=90, scorer=fuzz.token_sort_ratio):
+    """UCIC of the first candidate in master order scoring >= cutoff."""
+    for _, _, idx in process.extract_iter(query, block.names, scorer=scorer, score_cutoff=cutoff):
+        return block.ucics[idx]
+    return None
+
+
+def best_fuzzy_match(query, block, cutoff=90, scorer=fuzz.token_sort_ratio):
+    """UCIC of the best-scoring candidate (first on ties) if it scores >= cutoff."""
+    if not block.names:
+        return None
+    match = process.extractOne(query, block.names, scorer=scorer, score_cutoff=cutoff)
+    if match is None:
+        return None
+    return block.ucics[match[2]]
+
+
+# ---------- Single-Record Matching ---------- #
+
+_PAN_RE = re.compile(PAN_PATTERN)
+
+
+def match_record(rec, index, first_hit=False, persons_only_pan=True, cutoff=90, dob_fallback=False):
+    """(UCIC, rule) for one cleaned record (see ucic_clean.clean_ucic_record),
+    (None, None) if unmatched. Same rules and options as match_batch, with
+    the scalar index lookups, so a single record costs no pandas work."""
+    pan, dob = rec['pan'], rec['dob_day']
+    is_person = rec['party_tc'] == 'PERSON'
+    query = rec['full_name'] if is_person else rec['organization_name_norm']
+
+    if _PAN_RE.match(pan):
+        ucic = index.lookup_pan(pan, persons_only_pan)
+        if ucic is not None:
+            return ucic, 'pan'
+
+    if is_person and rec['aadhar_no']:
+        ucic = index.lookup_aadhar_dob(rec['aadhar_no'], dob)
+        if ucic is not None:
+            return ucic, 'aadhar_dob'
+
+    if dob is not None and (is_person or query):
+        fuzzy_match = first_fuzzy_match if first_hit else best_fuzzy_match
+        prepared = index.prepared_block(is_person, dob)
+        if prepared is not None:
+            ucic = fuzzy_match(sort_tokens(query), prepared, cutoff, scorer=fuzz.ratio)
+        else:
+            ucic = fuzzy_match(query, index.person_block(dob) if is_person else index.org_block(dob), cutoff)
+        return (ucic, 'fuzzy_person' if is_person else 'fuzzy_org') if ucic is not None else (None, None)
+
+    if dob is None and dob_fallback and query:
+        ucic = index.lookup_name(query, is_person, cutoff)
+        if ucic is not None:
+            return ucic, 'fuzzy_no_dob'
+
+    return None, None
+
+
+# ---------- Batch Matching ---------- #
+# Same rule order as the row-wise matchers (PAN, then Aadhar+DOB, then fuzzy
+# name/org within the DOB block), but every rule is applied to the whole
+# incoming frame at once and fuzzy scoring is one cdist call per
+# (party type, DOB) block.
+
+def _pick_winners(scores, first_hit):
+    # cdist zeroes every score below score_cutoff, so > 0 means a hit
+    hits = scores > 0
+    found = hits.any(axis=1)
+    if first_hit:
+        return found, hits.argmax(axis=1)
+    return found, scores.argmax(axis=1)
+
+
+def _score_block(queries, block, first_hit, cutoff, max_cells, workers):
+    ucics = np.asarray(block.ucics, dtype=object)
+    result = np.full(len(queries), None, dtype=object)
+    step = max(1, max_cells // len(block.names))
+    for start in range(0, len(queries), step):
+        scores = process.cdist(
+            queries[start:start + step], block.names,
+            scorer=fuzz.token_sort_ratio, score_cutoff=cutoff,
+            dtype=np.float64, workers=workers,
+        )
+        found, winners = _pick_winners(scores, first_hit)
+        result[start:start + step][found] = ucics[winners[found]]
+    return result
+
+
+RULES = ['pan', 'aadhar_dob', 'fuzzy_person', 'fuzzy_org', 'fuzzy_no_dob']
+
+
+def match_batch(df_new, index, first_hit=False, persons_only_pan=True, cutoff=90,
+                max_cells=BATCH_MAX_CELLS, workers=-1, stats=None, dob_fallback=False):
+    """Matched UCIC per row of a cleaned df_new (None where unmatched).
+
+    first_hit=True keeps find_ucic_match's "first candidate >= cutoff" pick,
+    otherwise the best-scoring candidate wins as in find_ucic_match_fast.
+    dob_fallback=True matches rows without a DOB by name over the whole
+    master (MasterIndex.lookup_name). workers is the cdist thread count
+    (-1 = all cores). stats (a RunStats) collects hits per rule (RULES),
+    fuzzy block sizes/timings and progress.
+    """
+    if stats is None:
+        stats = RunStats('match_batch', show_progress=False)
+    rule_hits = stats.rule_hits
+    result = np.full(len(df_new), None, dtype=object)
+    dob = df_new['dob_day'].to_numpy(dtype=object)
+    is_person = (df_new['party_tc'].str.strip().str.upper() == 'PERSON').to_numpy()
+
+    # 1. PAN match if valid
+    valid_pan = np.flatnonzero(df_new['pan'].str.match(PAN_PATTERN).fillna(False).to_numpy(dtype=bool))
+    result[valid_pan] = index.lookup_pans(df_new['pan'].to_numpy(dtype=object)[valid_pan], persons_only_pan)
+    rule_hits['pan'] += int(pd.notna(result[valid_pan]).sum())
+
+    # 2. Aadhar + DOB match for persons
+    aadhar = df_new['aadhar_no'].to_numpy(dtype=object)
+    todo = np.flatnonzero(pd.isna(result) & is_person & (aadhar != "") & pd.notna(dob))
+    result[todo] = index.lookup_aadhar_dobs(aadhar[todo], dob[todo])
+    rule_hits['aadhar_dob'] += int(pd.notna(result[todo]).sum())
+
+    # 3. Fuzzy name (persons) / org name (others) within the DOB block
+    org_name = df_new['organization_name_norm'].to_numpy(dtype=object)
+    names = df_new['full_name'].to_numpy(dtype=object)
+    queries = np.where(is_person, names, org_name)
+    todo = np.flatnonzero(pd.isna(result) & pd.notna(dob) & (is_person | (org_name != "")))
+    groups = pd.DataFrame({'person': is_person[todo], 'dob': dob[todo]}).groupby(['person', 'dob'], sort=False).indices
+    done = 0
+    for (person, block_dob), positions in groups.items():
+        done += len(positions)
+        block = index.person_block(block_dob) if person else index.org_block(block_dob)
+        if not block.names:
+            continue
+        rows = todo[positions]
+        start = time.perf_counter()
+        result[rows] = _score_block(queries[rows], block, first_hit, cutoff, max_cells, workers)
+        stats.record_block('person' if person else 'org', block_dob, len(block.names), len(rows),
+                           time.perf_counter() - start)
+        rule_hits['fuzzy_person' if person else 'fuzzy_org'] += int(pd.notna(result[rows]).sum())
+        stats.progress(done, len(todo))
+
+    # 4. No usable DOB: fuzzy name / org name over the whole master
+    if dob_fallback:
+        todo = np.flatnonzero(pd.isna(result) & pd.isna(dob) & (queries != ""))
+        groups = pd.DataFrame({'person': is_person[todo], 'name': queries[todo]}).groupby(['person', 'name'], sort=False).indices
+        for (person, name), positions in groups.items():
+            result[todo[positions]] = index.lookup_name(name, person, cutoff)
+        rule_hits['fuzzy_no_dob'] += int(pd.notna(result[todo]).sum())
+
+    return pd.Series(result, index=df_new.index, dtype=object)
+
+
+def split_matches(df_new, ucics):
+    """Matched (with matched_ucic) and unmatched frames, in input row order."""
+    hit = ucics.notna().to_numpy()
+    matched = df_new[hit].assign(matched_ucic=ucics[hit].infer_objects()).reset_index(drop=True)
+    unmatched = df_new[~hit].reset_index(drop=True)
+    return matched, unmatched
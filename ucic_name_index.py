@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+from rapidfuzz import process, fuzz
+
+# ---------- DOB-free Name Candidate Index ---------- #
+# The DOB blocks cannot help a record whose DOB is missing or unparseable.
+# For those, candidates come from character-trigram inverted lists over the
+# distinct master names instead: each token is padded (" amit ") and cut
+# into trigrams, so token order does not matter (as with token_sort_ratio)
+# and a typo only costs the few trigrams around it. A query reads the
+# posting lists of its rarest trigrams (at most POSTING_BUDGET entries), keeps
+# the TOP_K names sharing the most trigrams and scores only those, so the
+# work per query is independent of the master size.
+
+TOP_K = 50
+POSTING_BUDGET = 200_000
+
+
+def name_trigrams(name):
+    grams = set()
+    for token in name.split():
+        padded = f" {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NameIndex:
+
+    def __init__(self, names, first_rows):
+        """names: distinct non-empty names; first_rows: the first master
+        row carrying each name (ties between equal scores go to the lower row)."""
+        self.names = np.asarray(names, dtype=object)
+        self.first_rows = np.asarray(first_rows, dtype=np.int64)
+        gram_lists = [name_trigrams(name) for name in self.names.tolist()]
+        name_ids = np.repeat(np.arange(len(gram_lists), dtype=np.int32), [len(grams) for grams in gram_lists])
+        gram_codes, grams = pd.factorize(pd.Series([gram for grams in gram_lists for gram in grams], dtype=object))
+        # CSR posting lists: names of gram g are postings[starts[g]:starts[g + 1]]
+        order = np.argsort(gram_codes, kind='stable')
+        self.postings = name_ids[order]
+        self.starts = np.searchsorted(gram_codes[order], np.arange(len(grams) + 1))
+        self.gram_ids = {gram: i for i, gram in enumerate(grams)}
+
+    @classmethod
+    def from_codes(cls, codes, categories, rows):
+        """Index over the dictionary-encoded names of master rows (in master order)."""
+        codes = np.asarray(codes)[rows]
+        keep = codes >= 0
+        codes, rows = codes[keep], rows[keep]
+        unique_codes, first = np.unique(codes, return_index=True)
+        names = np.asarray(categories, dtype=object)[unique_codes]
+        non_empty = names != ""
+        return cls(names[non_empty], rows[first][non_empty])
+
+    def candidates(self, query, k=TOP_K):
+        """Ids of (up to) k names sharing the most trigrams with query."""
+        found = np.array([self.gram_ids[gram] for gram in sorted(name_trigrams(query)) if gram in self.gram_ids],
+                         dtype=np.int64)
+        if len(found) == 0:
+            return np.empty(0, dtype=np.int32)
+        lengths = self.starts[found + 1] - self.starts[found]
+        lists, budget = [], POSTING_BUDGET
+        for gram in found[np.argsort(lengths, kind='stable')].tolist():
+            postings = self.postings[self.starts[gram]:self.starts[gram + 1]]
+            if lists and len(postings) > budget:
+                break
+            lists.append(postings)
+            budget -= len(postings)
+        ids, counts = np.unique(np.concatenate(lists), return_counts=True)
+        # Most shared trigrams first, lower id on ties
+        top = np.lexsort((ids, -counts))[:k]
+        return ids[top]
+
+    def best_row(self, query, cutoff=90, k=TOP_K):
+        """First master row of the best-scoring candidate name, or -1 if no
+        candidate scores >= cutoff."""
+        ids = self.candidates(query, k)
+        if len(ids) == 0:
+            return -1
+        scores = process.cdist([query], self.names[ids].tolist(), scorer=fuzz.token_sort_ratio,
+                               score_cutoff=cutoff, dtype=np.float64)[0]
+        best = scores.max()
+        if best == 0:
+            return -1
+        return int(self.first_rows[ids[scores == best]].min())
@@ -0,0 +1,63 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from process_pools import pool_context
+from run_stats import RunStats
+from ucic_index import match_batch
+
+# ---------- Sharded Parallel Matching ---------- #
+# df_new is split into DOB-hash shards, so all rows of one DOB block land in
+# the same shard and each worker only ever touches its own slice of the
+# master blocks (plus the global PAN map). The MasterIndex is handed to the
+# workers once through the pool initializer: with the fork start method it
+# is inherited read-only from the parent and never pickled; elsewhere it is
+# pickled once per worker, never per task.
+
+# Shards per worker, so one heavy DOB block does not leave the rest idle
+SHARDS_PER_WORKER = 4
+
+_index = None
+
+
+def _init_worker(index):
+    global _index
+    _index = index
+
+
+def _match_shard(shard, match_kwargs):
+    stats = RunStats('shard', show_progress=False)
+    return match_batch(shard, _index, workers=1, stats=stats, **match_kwargs), stats
+
+
+def dob_shards(df_new, n_shards):
+    """Row positions of df_new per shard, split by a stable hash of the DOB."""
+    shard_ids = pd.util.hash_pandas_object(df_new['dob_day'].astype(str), index=False).to_numpy() % n_shards
+    shards = [np.flatnonzero(shard_ids == i) for i in range(n_shards)]
+    return [positions for positions in shards if len(positions)]
+
+
+def match_sharded(df_new, index, workers, stats=None, **match_kwargs):
+    """match_batch over DOB-hash shards in a process pool.
+
+    Every row's result depends only on that row and the index, so the merged
+    Series (written back by row position) is identical to a single
+    match_batch call. Worker rule hits and block stats are merged into stats.
+    """
+    if stats is None:
+        stats = RunStats('match_sharded', show_progress=False)
+    shards = dob_shards(df_new, workers * SHARDS_PER_WORKER)
+    result = np.full(len(df_new), None, dtype=object)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context(),
+                             initializer=_init_worker, initargs=(index,)) as pool:
+        futures = [pool.submit(_match_shard, df_new.iloc[positions], match_kwargs) for positions in shards]
+        done = 0
+        for positions, future in zip(shards, futures):
+            ucics, shard_stats = future.result()
+            result[positions] = ucics.to_numpy()
+            stats.merge(shard_stats)
+            done += len(positions)
+            stats.progress(done, len(df_new))
+
+    return pd.Series(result, index=df_new.index, dtype=object)
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# ---------- Compact Master Store ---------- #
+# The cleaned UCIC master without per-cell Python strings:
+#   pan          fixed-width bytes (S10, b"" when empty / not 10 ASCII chars)
+#   aadhar       Aadhar last 4 digits as int16 (-1 when missing)
+#   dob_day      int32 days since 1970-01-01 (MISSING_DOB when unparsed)
+#   party_tc     categorical codes
+#   ucic         categorical codes
+#   full_name    dictionary-encoded (categorical) canonical person name
+#   org_name     dictionary-encoded canonical organization name
+# Every column is a flat numpy array, so a store (and the MasterIndex built
+# on it) pickles fast and is shared copy-on-write with forked workers.
+
+PAN_WIDTH = 10
+
+MISSING_DOB = np.iinfo(np.int32).min
+
+
+def encode_pans(values):
+    """S10 array of PANs; anything that is not 10 ASCII characters or less
+    (so can never equal a valid PAN) becomes b""."""
+    values = pd.Series(values, dtype=object).fillna("").astype(str)
+    fits = (values.str.len() <= PAN_WIDTH) & values.str.isascii()
+    return values.where(fits, "").to_numpy().astype(f'S{PAN_WIDTH}')
+
+
+def encode_aadhar(values):
+    """int16 Aadhar last-4 (-1 for missing / non-numeric)."""
+    # Blanks coerce to NaN like any other non-number (replace("", None) would pad on pandas < 3)
+    numbers = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce')
+    return numbers.fillna(-1).to_numpy().astype(np.int16)
+
+
+def encode_dob(days):
+    """int32 day numbers from an Int32 dob_day column (MISSING_DOB for <NA>)."""
+    return pd.array(days, dtype='Int32').to_numpy(dtype=np.int32, na_value=MISSING_DOB)
+
+
+def _categorical(values):
+    # Object categories in first-appearance order, so stores always concat
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object).fillna(""))
+    return pd.Categorical.from_codes(codes, pd.Index(uniques, dtype=object))
+
+
+class MasterStore:
+
+    COLUMNS = ['pan', 'aadhar', 'dob_day', 'party_tc', 'ucic', 'full_name', 'org_name']
+
+    def __init__(self, pan, aadhar, dob_day, party_tc, ucic, full_name, org_name):
+        self.pan = pan
+        self.aadhar = aadhar
+        self.dob_day = dob_day
+        self.party_tc = party_tc
+        self.ucic = ucic
+        self.full_name = full_name
+        self.org_name = org_name
+
+    @classmethod
+    def from_frame(cls, df):
+        """Store for a cleaned UCIC frame (see ucic_clean.clean_ucic_frame)."""
+        return cls(
+            pan=encode_pans(df['pan']),
+            aadhar=encode_aadhar(df['aadhar_no']),
+            dob_day=encode_dob(df['dob_day']),
+            party_tc=_categorical(df['party_tc']),
+            ucic=_categorical(df['ucic']),
+            full_name=_categorical(df['full_name']),
+            org_name=_categorical(df['organization_name_norm']),
+        )
+
+    @classmethod
+    def concat(cls, stores):
+        """One store with the rows of stores, in order."""
+        stores = list(stores)
+        columns = {}
+        for name in cls.COLUMNS:
+            parts = [getattr(store, name) for store in stores]
+            if isinstance(parts[0], pd.Categorical):
+                union = union_categoricals(parts)
+                columns[name] = pd.Categorical.from_codes(union.codes, pd.Index(union.categories, dtype=object))
+            else:
+                columns[name] = np.concatenate(parts)
+        return cls(**columns)
+
+    def __len__(self):
+        return len(self.pan)
+
+    def nbytes(self):
+        """Approximate memory of the store in bytes (codes plus dictionaries)."""
+        total = 0
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            if isinstance(column, pd.Categorical):
+                total += column.codes.nbytes + int(column.categories.memory_usage(deep=True))
+            else:
+                total += column.nbytes
+        return total
+
+    def to_frame(self, positions=None):
+        """Decoded DataFrame (cleaned-frame column names) of the given rows
+        (all rows by default), for reports that need master rows back."""
+        if positions is None:
+            positions = np.arange(len(self))
+        dob = self.dob_day[positions]
+        aadhar = self.aadhar[positions]
+        return pd.DataFrame({
+            'ucic': np.asarray(self.ucic)[positions],
+            'party_tc': np.asarray(self.party_tc)[positions],
+            'pan': self.pan[positions].astype(str),
+            'aadhar_no': np.where(aadhar >= 0, pd.Series(aadhar).astype(str).str.zfill(4), ""),
+            'dob_day': pd.array(np.where(dob == MISSING_DOB, None, dob), dtype='Int32'),
+            'full_name': np.asarray(self.full_name)[positions],
+            'organization_name_norm': np.asarray(self.org_name)[positions],
+        })
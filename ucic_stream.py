@@ -0,0 +1,87 @@
+import pandas as pd
+
+from dob_parser import format_stats, summed_stats
+from run_stats import RunStats
+from ucic_clean import clean_ucic_frame
+from ucic_index import match_batch, split_matches
+
+# ---------- Streaming Ingestion ---------- #
+# The new-customer file is read CHUNK_ROWS rows at a time (CSV chunks or
+# openpyxl read-only row iteration for Excel). Each chunk is cleaned, matched
+# against the in-memory MasterIndex and appended to the outputs before the
+# next one is read, so memory stays bounded by the index plus one chunk.
+
+CHUNK_ROWS = 50_000
+
+# Arrow types of output columns that one chunk may not show (a chunk without
+# matches or without any parseable DOB); for open_output(column_types=...)
+OUTPUT_COLUMN_TYPES = {'dob': 'date32', 'matched_ucic': 'string'}
+
+
+def _cell_str(value):
+    # Same text read_excel(dtype=str) gives: whole floats lose their ".0"
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _iter_excel_chunks(path, chunksize):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_cell_str(cell) or "" for cell in next(rows, ())]
+        batch = []
+        for row in rows:
+            batch.append([_cell_str(cell) for cell in row[:len(header)]])
+            if len(batch) == chunksize:
+                yield pd.DataFrame(batch, columns=header, dtype=object)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header, dtype=object)
+    finally:
+        workbook.close()
+
+
+def iter_new_chunks(path, chunksize=CHUNK_ROWS):
+    """Raw new-customer rows (all text) in frames of at most chunksize rows."""
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        return _iter_excel_chunks(path, chunksize)
+    return pd.read_csv(path, dtype=str, chunksize=chunksize)
+
+
+def match_stream(path, index, matched_out, unmatched_out, chunksize=CHUNK_ROWS, stats=None, **match_kwargs):
+    """Clean, match and write the new-customer file chunk by chunk.
+
+    matched_out / unmatched_out are output_writers sinks; match_kwargs go to
+    match_batch. Per-chunk read / clean / match / export times add up into
+    one stage each of stats (a RunStats). Returns (matched, unmatched) row
+    counts.
+    """
+    if stats is None:
+        stats = RunStats('match_stream')
+    # DOB counts of all chunks, printed once at the end
+    clean_stats = RunStats('clean', show_progress=False)
+    chunks = iter_new_chunks(path, chunksize)
+    while True:
+        with stats.stage("read new file", quiet=True):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        with stats.stage("clean new file", rows=len(chunk), quiet=True):
+            df_new = clean_ucic_frame(chunk, clean_stats, 'new file dob')
+        with stats.stage("match", rows=len(df_new), quiet=True):
+            chunk_stats = RunStats('chunk', show_progress=False)
+            matched, unmatched = split_matches(df_new, match_batch(df_new, index, stats=chunk_stats, **match_kwargs))
+            stats.merge(chunk_stats)
+        with stats.stage("export", rows=len(df_new), quiet=True):
+            matched_out.write(matched)
+            unmatched_out.write(unmatched)
+        stats.progress(matched_out.rows + unmatched_out.rows)
+
+    print(format_stats(summed_stats(clean_stats.tallies.get('new file dob', {})), 'new file'))
+    stats.merge(clean_stats)
+    return matched_out.rows, unmatched_out.rows